@@ -0,0 +1,319 @@
+/*
+ * Native error diffusion kernel.
+ *
+ * Mirrors error_diffusion_kernel in error_diffusion.py exactly: integer
+ * palette search, fixed-point diffusion weights, round half to even and
+ * clamping like the Uint8ClampedArray of the JavaScript implementation.
+ * Arrays are passed through the buffer protocol, so no NumPy headers are
+ * needed to build it.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+
+/* Must match FIXED_POINT_BITS in error_diffusion.py */
+#define FIXED_POINT_BITS 15
+/* Must match LUT_AMBIGUOUS in find_closest_color.py */
+#define LUT_AMBIGUOUS 255
+
+static long
+add_error(long value, long error, long weight)
+{
+    const long half = 1L << (FIXED_POINT_BITS - 1);
+    long total = value * (1L << FIXED_POINT_BITS) + error * weight;
+    /* Floor division, independent of how the compiler shifts negatives */
+    long result = total >= 0
+        ? total >> FIXED_POINT_BITS
+        : -((-total + (1L << FIXED_POINT_BITS) - 1) >> FIXED_POINT_BITS);
+    long remainder = total - result * (1L << FIXED_POINT_BITS);
+
+    if (remainder > half || (remainder == half && (result & 1))) {
+        result += 1;
+    }
+    if (result < 0) {
+        return 0;
+    }
+    if (result > 255) {
+        return 255;
+    }
+    return result;
+}
+
+/*
+ * Exact weighted search for the closest palette color (first one wins on
+ * ties). The palette is stored as three planes of int32 values so the
+ * distance loop has no branches and the compiler can vectorize it; the
+ * distances fit in int32 since channel weights are small.
+ */
+static Py_ssize_t
+closest_color(int32_t r, int32_t g, int32_t b, int32_t *planes, Py_ssize_t colors,
+              const int32_t *channel_weights)
+{
+    const int32_t *red = planes;
+    const int32_t *green = planes + colors;
+    const int32_t *blue = planes + 2 * colors;
+    int32_t *distances = planes + 3 * colors;
+    const int32_t weight_r = channel_weights[0];
+    const int32_t weight_g = channel_weights[1];
+    const int32_t weight_b = channel_weights[2];
+    Py_ssize_t k, closest = 0;
+
+    for (k = 0; k < colors; k++) {
+        int32_t dr = r - red[k];
+        int32_t dg = g - green[k];
+        int32_t db = b - blue[k];
+        distances[k] = weight_r * dr * dr + weight_g * dg * dg + weight_b * db * db;
+    }
+    for (k = 1; k < colors; k++) {
+        if (distances[k] < distances[closest]) {
+            closest = k;
+        }
+    }
+    return closest;
+}
+
+/*
+ * Error diffusion over the whole image. Always inlined into diffuse with a
+ * constant neighbor count for each built-in kernel size, so the compiler
+ * can fully unroll the neighbor loop.
+ */
+static inline void
+diffuse_kernel(uint8_t *pixels, Py_ssize_t height, Py_ssize_t width, Py_ssize_t channels,
+               const int16_t *palette, int32_t *planes, Py_ssize_t colors,
+               const int32_t *channel_weights,
+               const uint8_t *lut, Py_ssize_t lut_cells, int lut_shift,
+               const int8_t *offsets, const int32_t *weights, Py_ssize_t neighbors,
+               Py_ssize_t reach, Py_ssize_t depth, int serpentine)
+{
+    Py_ssize_t y, i, n;
+
+    for (y = 0; y < height; y++) {
+        int reverse = serpentine && (y % 2 == 1);
+        for (i = 0; i < width; i++) {
+            Py_ssize_t x = reverse ? width - 1 - i : i;
+            uint8_t *pixel = pixels + (y * width + x) * channels;
+            long r = pixel[0];
+            long g = pixel[1];
+            long b = pixel[2];
+
+            /* Closest palette color (first one wins on ties). Values are
+             * always 0-255 here, and the lookup table is exact wherever it
+             * is unambiguous. */
+            Py_ssize_t closest = lut[
+                ((r >> lut_shift) * lut_cells + (g >> lut_shift)) * lut_cells
+                + (b >> lut_shift)];
+            if (closest == LUT_AMBIGUOUS) {
+                closest = closest_color(r, g, b, planes, colors, channel_weights);
+            }
+
+            pixel[0] = palette[closest * 3];
+            pixel[1] = palette[closest * 3 + 1];
+            pixel[2] = palette[closest * 3 + 2];
+
+            long error_r = r - pixel[0];
+            long error_g = g - pixel[1];
+            long error_b = b - pixel[2];
+
+            /* Away from the edges every neighbor is inside the image */
+            int inside = x >= reach && x < width - reach && y + depth < height;
+
+            for (n = 0; n < neighbors; n++) {
+                Py_ssize_t offset_x = reverse ? -offsets[n * 2] : offsets[n * 2];
+                Py_ssize_t target_x = x + offset_x;
+                Py_ssize_t target_y = y + offsets[n * 2 + 1];
+                if (!inside && (target_x < 0 || target_x >= width || target_y >= height)) {
+                    continue;
+                }
+
+                uint8_t *target = pixels + (target_y * width + target_x) * channels;
+                target[0] = (uint8_t)add_error(target[0], error_r, weights[n]);
+                target[1] = (uint8_t)add_error(target[1], error_g, weights[n]);
+                target[2] = (uint8_t)add_error(target[2], error_b, weights[n]);
+            }
+        }
+    }
+}
+
+static void
+diffuse(uint8_t *pixels, Py_ssize_t height, Py_ssize_t width, Py_ssize_t channels,
+        const int16_t *palette, int32_t *planes, Py_ssize_t colors,
+        const int32_t *channel_weights,
+        const uint8_t *lut, Py_ssize_t lut_cells,
+        const int8_t *offsets, const int32_t *weights, Py_ssize_t neighbors,
+        int serpentine)
+{
+    Py_ssize_t n, reach = 0, depth = 0;
+    int lut_shift = 0;
+
+    while ((256 >> lut_shift) > lut_cells) {
+        lut_shift++;
+    }
+    for (n = 0; n < neighbors; n++) {
+        Py_ssize_t dx = offsets[n * 2] < 0 ? -offsets[n * 2] : offsets[n * 2];
+        reach = dx > reach ? dx : reach;
+        depth = offsets[n * 2 + 1] > depth ? offsets[n * 2 + 1] : depth;
+    }
+
+#define DIFFUSE(count) \
+    diffuse_kernel(pixels, height, width, channels, palette, planes, colors, channel_weights, \
+                   lut, lut_cells, lut_shift, offsets, weights, count, reach, depth, \
+                   serpentine)
+
+    /* Neighbor counts of the built-in diffusion maps */
+    switch (neighbors) {
+    case 3:
+        DIFFUSE(3);
+        break;
+    case 4:
+        DIFFUSE(4);
+        break;
+    case 7:
+        DIFFUSE(7);
+        break;
+    case 10:
+        DIFFUSE(10);
+        break;
+    case 12:
+        DIFFUSE(12);
+        break;
+    default:
+        DIFFUSE(neighbors);
+    }
+
+#undef DIFFUSE
+}
+
+static int
+get_buffer(PyObject *obj, Py_buffer *view, int flags, const char *name,
+           Py_ssize_t itemsize, int ndim, Py_ssize_t last_dim)
+{
+    if (PyObject_GetBuffer(obj, view, flags | PyBUF_C_CONTIGUOUS) < 0) {
+        return -1;
+    }
+    if (view->itemsize != itemsize || view->ndim != ndim
+            || (last_dim > 0 && view->shape[ndim - 1] != last_dim)) {
+        PyErr_Format(PyExc_ValueError, "%s has an unexpected dtype or shape", name);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *
+error_diffusion_kernel(PyObject *self, PyObject *args)
+{
+    PyObject *image_obj, *palette_obj, *channel_weights_obj, *lut_obj;
+    PyObject *offsets_obj, *weights_obj;
+    Py_buffer image, palette, channel_weights, lut, offsets, weights;
+    const int16_t *colors;
+    int32_t *planes;
+    Py_ssize_t count, k;
+    int serpentine;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "OOOOOOp", &image_obj, &palette_obj,
+                          &channel_weights_obj, &lut_obj, &offsets_obj,
+                          &weights_obj, &serpentine)) {
+        return NULL;
+    }
+
+    if (get_buffer(image_obj, &image, PyBUF_WRITABLE, "image", 1, 3, 0) < 0) {
+        return NULL;
+    }
+    if (get_buffer(palette_obj, &palette, 0, "palette", 2, 2, 3) < 0) {
+        goto release_image;
+    }
+    if (get_buffer(channel_weights_obj, &channel_weights, 0, "channel_weights", 4, 1, 3) < 0) {
+        goto release_palette;
+    }
+    if (get_buffer(lut_obj, &lut, 0, "lut", 1, 3, 0) < 0) {
+        goto release_channel_weights;
+    }
+    if (get_buffer(offsets_obj, &offsets, 0, "offsets", 1, 2, 2) < 0) {
+        goto release_lut;
+    }
+    if (get_buffer(weights_obj, &weights, 0, "weights", 4, 1, 0) < 0) {
+        goto release_offsets;
+    }
+    if (lut.shape[0] < 1 || lut.shape[0] > 256 || (lut.shape[0] & (lut.shape[0] - 1))
+            || lut.shape[1] != lut.shape[0] || lut.shape[2] != lut.shape[0]) {
+        PyErr_SetString(PyExc_ValueError, "lut must be a cube with a power of two side");
+        goto release_weights;
+    }
+    if (image.shape[2] < 3) {
+        PyErr_SetString(PyExc_ValueError, "image needs at least 3 channels");
+        goto release_weights;
+    }
+    if (palette.shape[0] == 0) {
+        PyErr_SetString(PyExc_ValueError, "palette is empty");
+        goto release_weights;
+    }
+    if (weights.shape[0] != offsets.shape[0]) {
+        PyErr_SetString(PyExc_ValueError, "offsets and weights differ in length");
+        goto release_weights;
+    }
+
+    /* Red, green and blue planes of the palette plus room for distances */
+    count = palette.shape[0];
+    planes = PyMem_Malloc(4 * count * sizeof(int32_t));
+    if (planes == NULL) {
+        PyErr_NoMemory();
+        goto release_weights;
+    }
+    colors = (const int16_t *)palette.buf;
+    for (k = 0; k < count; k++) {
+        planes[k] = colors[k * 3];
+        planes[count + k] = colors[k * 3 + 1];
+        planes[2 * count + k] = colors[k * 3 + 2];
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    diffuse((uint8_t *)image.buf, image.shape[0], image.shape[1], image.shape[2],
+            colors, planes, count,
+            (const int32_t *)channel_weights.buf,
+            (const uint8_t *)lut.buf, lut.shape[0],
+            (const int8_t *)offsets.buf, (const int32_t *)weights.buf,
+            offsets.shape[0], serpentine);
+    Py_END_ALLOW_THREADS
+    PyMem_Free(planes);
+
+    result = Py_None;
+    Py_INCREF(result);
+
+release_weights:
+    PyBuffer_Release(&weights);
+release_offsets:
+    PyBuffer_Release(&offsets);
+release_lut:
+    PyBuffer_Release(&lut);
+release_channel_weights:
+    PyBuffer_Release(&channel_weights);
+release_palette:
+    PyBuffer_Release(&palette);
+release_image:
+    PyBuffer_Release(&image);
+    return result;
+}
+
+static PyMethodDef methods[] = {
+    {"error_diffusion_kernel", error_diffusion_kernel, METH_VARARGS,
+     "error_diffusion_kernel(image, palette, channel_weights, lut, offsets, weights, serpentine)\n"
+     "--\n\n"
+     "Dither the RGB channels of a uint8 (H, W, C) image in place using error diffusion."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT,
+    "_ed_c",
+    "Native error diffusion kernel.",
+    -1,
+    methods
+};
+
+PyMODINIT_FUNC
+PyInit__ed_c(void)
+{
+    return PyModule_Create(&module);
+}
@@ -1,7 +1,25 @@
 """Bayer matrix generation for ordered dithering."""
 
+import functools
 from typing import List, Tuple
 
+import numpy as np
+
+# Pre-computed 8x8 Bayer matrix
+_BIG_MATRIX = np.array(
+    [
+        [0, 48, 12, 60, 3, 51, 15, 63],
+        [32, 16, 44, 28, 35, 19, 47, 31],
+        [8, 56, 4, 52, 11, 59, 7, 55],
+        [40, 24, 36, 20, 43, 27, 39, 32],
+        [2, 50, 14, 62, 1, 49, 13, 61],
+        [34, 18, 46, 30, 33, 17, 45, 29],
+        [10, 58, 6, 54, 9, 57, 5, 53],
+        [42, 26, 38, 22, 41, 25, 37, 21],
+    ],
+    dtype=np.int64,
+)
+
 
 def create_bayer_matrix(size: Tuple[int, int]) -> List[List[int]]:
     """
@@ -13,46 +31,45 @@ def create_bayer_matrix(size: Tuple[int, int]) -> List[List[int]]:
     Returns:
         A 2D list representing the Bayer matrix
     """
+    return get_bayer_matrix(size).tolist()
+
+
+def get_bayer_matrix(size: Tuple[int, int]) -> np.ndarray:
+    """
+    Get the shared Bayer threshold matrix for ordered dithering.
+
+    Matrices are built once per size and returned read-only.
+
+    Args:
+        size: Tuple of (width, height), max 8x8
+
+    Returns:
+        A read-only (height, width) integer array
+    """
     width = min(size[0], 8) if size[0] < 8 else 8
     height = min(size[1], 8) if size[1] < 8 else 8
+    return _bayer_matrix(width, height)
 
-    # Pre-computed 8x8 Bayer matrix
-    big_matrix = [
-        [0, 48, 12, 60, 3, 51, 15, 63],
-        [32, 16, 44, 28, 35, 19, 47, 31],
-        [8, 56, 4, 52, 11, 59, 7, 55],
-        [40, 24, 36, 20, 43, 27, 39, 32],
-        [2, 50, 14, 62, 1, 49, 13, 61],
-        [34, 18, 46, 30, 33, 17, 45, 29],
-        [10, 58, 6, 54, 9, 57, 5, 53],
-        [42, 26, 38, 22, 41, 25, 37, 21],
-    ]
 
+@functools.lru_cache(maxsize=64)
+def _bayer_matrix(width: int, height: int) -> np.ndarray:
+    """Build the read-only (cached) Bayer matrix for a clamped size."""
     # If using full 8x8, return the big matrix directly
     if width == 8 and height == 8:
-        return big_matrix
-
-    # Create a smaller matrix by extracting the needed portion
-    matrix = []
-    for y in range(height):
-        row = []
-        for x in range(width):
-            # Note: JavaScript code uses bigMatrix[x][y] which is transposed access
-            row.append(big_matrix[x][y])
-        matrix.append(row)
-
-    # Re-index the matrix values to be sequential 0 to (width*height - 1)
-    # Flatten, sort, create index mapping
-    flat_values = []
-    for row in matrix:
-        flat_values.extend(row)
-
-    sorted_values = sorted(flat_values)
-    index_map = {v: i for i, v in enumerate(sorted_values)}
-
-    # Apply the new indices
-    for y in range(len(matrix)):
-        for x in range(len(matrix[y])):
-            matrix[y][x] = index_map[matrix[y][x]]
-
-    return matrix
+        matrix = _BIG_MATRIX.copy()
+        matrix.setflags(write=False)
+        return matrix
+
+    # Extract the needed portion. Note: JavaScript code uses bigMatrix[x][y]
+    # which is transposed access
+    matrix = _BIG_MATRIX[:max(width, 0), :max(height, 0)].T
+
+    # Re-index the matrix values to be sequential 0 to (width*height - 1).
+    # The table contains 32 twice; like the JS index map, duplicates share
+    # the rank of their last sorted position.
+    flat = matrix.ravel()
+    ranks = np.searchsorted(np.sort(flat), flat, side="right") - 1
+
+    ranks = ranks.reshape(matrix.shape)
+    ranks.setflags(write=False)
+    return ranks
@@ -1,7 +1,13 @@
 """Color helper utilities for converting between color formats."""
 
 import re
-from typing import List, Optional
+import string
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+_HEX_DIGITS = frozenset(string.hexdigits)
+_SHORTHAND_REGEX = re.compile(r'^#?([a-f\d])([a-f\d])([a-f\d])$', re.IGNORECASE)
+_FULL_REGEX = re.compile(r'^#?([a-f\d]{2})([a-f\d]{2})([a-f\d]{2})$', re.IGNORECASE)
 
 
 def hex_to_rgb(hex_color: str) -> Optional[List[int]]:
@@ -17,21 +23,31 @@ def hex_to_rgb(hex_color: str) -> Optional[List[int]]:
     Returns:
         A list of [R, G, B] values (0-255), or None if parsing fails
     """
+    rgb = _parse_hex(hex_color)
+    return list(rgb) if rgb is not None else None
+
+
+@lru_cache(maxsize=256)
+def _parse_hex(hex_color: str) -> Optional[Tuple[int, int, int]]:
+    """Parse a hex color string into an (R, G, B) tuple, or None if invalid."""
+    # Fast path for the common #RRGGBB format
+    digits = hex_color[1:] if hex_color[:1] == "#" else hex_color
+    if len(digits) == 6 and _HEX_DIGITS.issuperset(digits):
+        return (int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16))
+
     # Handle shorthand hex format (#RGB -> #RRGGBB)
-    shorthand_regex = re.compile(r'^#?([a-f\d])([a-f\d])([a-f\d])$', re.IGNORECASE)
-    match = shorthand_regex.match(hex_color)
+    match = _SHORTHAND_REGEX.match(hex_color)
     if match:
         r, g, b = match.groups()
         hex_color = r + r + g + g + b + b
 
     # Parse full hex format
-    full_regex = re.compile(r'^#?([a-f\d]{2})([a-f\d]{2})([a-f\d]{2})$', re.IGNORECASE)
-    match = full_regex.match(hex_color)
+    match = _FULL_REGEX.match(hex_color)
 
     if match:
-        return [
+        return (
             int(match.group(1), 16),
             int(match.group(2), 16),
             int(match.group(3), 16)
-        ]
+        )
     return None
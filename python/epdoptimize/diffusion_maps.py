@@ -1,6 +1,8 @@
 """Error diffusion maps for dithering algorithms."""
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
 
 
 def floyd_steinberg() -> List[Dict[str, Any]]:
@@ -110,7 +112,7 @@ def sierra2_4a() -> List[Dict[str, Any]]:
 
 
 # Map of diffusion kernel names to their functions
-DIFFUSION_MAPS = {
+DIFFUSION_KERNELS = {
     "floydSteinberg": floyd_steinberg,
     "falseFloydSteinberg": false_floyd_steinberg,
     "jarvis": jarvis,
@@ -122,7 +124,22 @@ DIFFUSION_MAPS = {
 }
 
 
-def get_diffusion_map(name: str) -> List[Dict[str, Any]]:
+def _to_arrays(diffusion_map: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert a list of offset/factor dictionaries to (offsets, factors) arrays."""
+    offsets = np.array([entry["offset"] for entry in diffusion_map], dtype=np.int8)
+    factors = np.array([entry["factor"] for entry in diffusion_map], dtype=np.float32)
+    # The arrays are shared by every caller, so guard them against mutation
+    offsets.setflags(write=False)
+    factors.setflags(write=False)
+    return offsets, factors
+
+
+# Map of diffusion kernel names to (offsets, factors) arrays, where offsets
+# holds one [dx, dy] row per neighbor
+DIFFUSION_MAPS = {name: _to_arrays(func()) for name, func in DIFFUSION_KERNELS.items()}
+
+
+def get_diffusion_map(name: str) -> Tuple[np.ndarray, np.ndarray]:
     """
     Get a diffusion map by name.
 
@@ -130,8 +147,22 @@ def get_diffusion_map(name: str) -> List[Dict[str, Any]]:
         name: Name of the diffusion kernel
 
     Returns:
-        The diffusion map as a list of offset/factor dictionaries
+        An (offsets, factors) tuple: an int8 array of shape (N, 2) holding
+        [dx, dy] per neighbor and a float32 array of shape (N,) of weights
+    """
+    return DIFFUSION_MAPS.get(name, DIFFUSION_MAPS["floydSteinberg"])
+
+
+def get_diffusion_map_entries(name: str) -> List[Dict[str, Any]]:
+    """
+    Get a diffusion map by name as a list of offset/factor dictionaries.
+
+    This is the layout used by the JavaScript implementation.
+
+    Args:
+        name: Name of the diffusion kernel
+
+    Returns:
+        A new list of {"offset": [dx, dy], "factor": weight} dictionaries
     """
-    if name in DIFFUSION_MAPS:
-        return DIFFUSION_MAPS[name]()
-    return floyd_steinberg()  # Default to Floyd-Steinberg
+    return DIFFUSION_KERNELS.get(name, DIFFUSION_KERNELS["floydSteinberg"])()
@@ -1,16 +1,24 @@
 """Main dithering module for e-paper display optimization."""
 
+import functools
 import json
 import os
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Sequence, Tuple, Union
 
 import numpy as np
 from PIL import Image
 
-from .bayer_matrix import create_bayer_matrix
+from .bayer_matrix import get_bayer_matrix
 from .color_helpers import hex_to_rgb
 from .diffusion_maps import get_diffusion_map
-from .find_closest_color import find_closest_palette_color
+from .error_diffusion import diffuse_errors, fixed_point_weights
+from .find_closest_color import (
+    find_closest_palette_indices_gpu,
+    get_cupy,
+    get_distance_weights,
+    get_palette_lut,
+    lookup_palette_indices,
+)
 from .utilities import random_integer
 
 # Load default palettes
@@ -28,17 +36,19 @@ DEFAULT_OPTIONS = {
     "orderedDitheringMatrix": [4, 4],
     "randomDitheringType": "blackAndWhite",
     "palette": "default",
+    "distanceMetric": "euclidean",
+    "backend": "cpu",
     "sampleColorsFromImage": False,
     "numberOfSampleColors": 10,
 }
 
 
-def set_color_palette(palette: Union[str, List[str]]) -> List[List[int]]:
+def set_color_palette(palette: Union[str, Sequence[str]]) -> List[List[int]]:
     """
     Convert a palette specification to a list of RGB values.
 
     Args:
-        palette: Either a palette name (str) or a list of hex color strings
+        palette: Either a palette name (str) or a sequence of hex color strings
 
     Returns:
         List of [R, G, B] color values
@@ -51,6 +61,30 @@ def set_color_palette(palette: Union[str, List[str]]) -> List[List[int]]:
     return [hex_to_rgb(color) for color in palette_array]
 
 
+@functools.lru_cache(maxsize=32)
+def _palette_array(palette: Union[str, Tuple[str, ...]]) -> np.ndarray:
+    """Parse a palette once into a read-only (K, 3) int16 array."""
+    array = np.asarray(set_color_palette(palette), dtype=np.int16)
+    array.setflags(write=False)
+    return array
+
+
+@functools.lru_cache(maxsize=8)
+def _ordered_offsets(matrix_size: Tuple[int, int], height: int, width: int) -> np.ndarray:
+    """Build the read-only (H, W, 1) ordered dithering offsets for an image size."""
+    threshold_map = get_bayer_matrix(matrix_size).astype(np.float32)
+    map_height, map_width = threshold_map.shape
+    ordered_dither_threshold = 256 / 4
+
+    # Tile the threshold offsets over the whole image
+    offsets = np.tile(
+        threshold_map / (map_height * map_width) * ordered_dither_threshold,
+        (-(-height // map_height), -(-width // map_width)),
+    )[:height, :width, None]
+    offsets.setflags(write=False)
+    return offsets
+
+
 def get_pixel_color_values(pixel_index: int, data: np.ndarray) -> List[float]:
     """Extract RGBA values from image data at a given pixel index."""
     return [
@@ -61,39 +95,23 @@ def get_pixel_color_values(pixel_index: int, data: np.ndarray) -> List[float]:
     ]
 
 
-def clamp_uint8(value: float) -> float:
-    """Clamp a value to mimic JavaScript's Uint8ClampedArray behavior.
-
-    Uint8ClampedArray clamps to 0-255 on assignment. We keep float precision
-    for intermediate calculations to match JavaScript's behavior.
-    """
-    if value < 0:
-        return 0.0
-    if value > 255:
-        return 255.0
-    return value
-
-
-def set_pixel(data: np.ndarray, pixel_index: int, pixel: List[float]) -> None:
-    """Set RGBA values in image data at a given pixel index.
+def get_quant_error(old_pixel: List[float], new_pixel: List[float]) -> List[float]:
+    """Calculate the quantization error between old and new pixel values.
 
-    Values are clamped to 0-255 to match JavaScript's Uint8ClampedArray behavior.
+    Per-pixel reference helper mirroring the JavaScript implementation;
+    dither_image computes errors inside the error diffusion kernel instead.
     """
-    data[pixel_index] = clamp_uint8(pixel[0])
-    data[pixel_index + 1] = clamp_uint8(pixel[1])
-    data[pixel_index + 2] = clamp_uint8(pixel[2])
-    data[pixel_index + 3] = clamp_uint8(pixel[3])
-
-
-def get_quant_error(old_pixel: List[float], new_pixel: List[float]) -> List[float]:
-    """Calculate the quantization error between old and new pixel values."""
     return [old_pixel[i] - new_pixel[i] for i in range(len(old_pixel))]
 
 
 def add_quant_error(
     pixel: List[float], quant_error: List[float], diffusion_factor: float
 ) -> List[float]:
-    """Add weighted quantization error to a pixel."""
+    """Add weighted quantization error to a pixel.
+
+    Per-pixel reference helper mirroring the JavaScript implementation;
+    dither_image applies fixed-point weights inside the error diffusion kernel.
+    """
     return [pixel[i] + quant_error[i] * diffusion_factor for i in range(len(pixel))]
 
 
@@ -136,6 +154,97 @@ def pixel_xy(index: int, width: int) -> List[int]:
     return [index % width, index // width]
 
 
+def _palette_indices(
+    pixels: np.ndarray, palette: np.ndarray, metric: Tuple[int, int, int], backend: str
+) -> np.ndarray:
+    """Find the closest palette index per pixel, on the GPU if requested and available."""
+    if backend == "cuda" and get_cupy() is not None:
+        return find_closest_palette_indices_gpu(pixels, palette, metric)
+    return lookup_palette_indices(pixels, palette, get_palette_lut(palette, metric), metric)
+
+
+def _quantize(
+    image_data: np.ndarray,
+    palette: np.ndarray,
+    metric: Tuple[int, int, int],
+    backend: str,
+) -> np.ndarray:
+    """Replace every pixel with its closest palette color."""
+    result = np.empty_like(image_data)
+    result[..., :3] = palette[_palette_indices(image_data, palette, metric, backend)]
+    result[..., 3] = 255
+    return result
+
+
+def _random_dither_rgb(image_data: np.ndarray) -> np.ndarray:
+    """Threshold each RGB channel against its own random value."""
+    height, width = image_data.shape[:2]
+    thresholds = np.random.default_rng().integers(0, 256, (height, width, 3), dtype=np.uint8)
+    result = image_data.copy()
+    result[..., :3] = np.where(image_data[..., :3] < thresholds, 0, 255)
+    return result
+
+
+def _random_dither_black_and_white(image_data: np.ndarray) -> np.ndarray:
+    """Threshold the average of the RGB channels against a random value."""
+    height, width = image_data.shape[:2]
+    average_rgb = image_data[..., :3].sum(axis=-1) / 3
+    thresholds = np.random.default_rng().integers(0, 256, (height, width), dtype=np.uint8)
+    result = np.empty_like(image_data)
+    result[..., :3] = np.where(average_rgb < thresholds, 0, 255)[..., None]
+    result[..., 3] = 255
+    return result
+
+
+def _ordered_dither(
+    image_data: np.ndarray,
+    palette: np.ndarray,
+    metric: Tuple[int, int, int],
+    matrix_size: List[int],
+    backend: str,
+) -> np.ndarray:
+    """Offset pixels by a tiled Bayer matrix, then quantize them."""
+    height, width = image_data.shape[:2]
+    offsets = _ordered_offsets((matrix_size[0], matrix_size[1]), height, width)
+    # Offsets are fractional, so only the shifted copy needs to be float
+    shifted = image_data[..., :3] + offsets
+    result = np.empty_like(image_data)
+    result[..., :3] = palette[_palette_indices(shifted, palette, metric, backend)]
+    result[..., 3] = 255
+    return result
+
+
+def _error_diffusion_dither(
+    image_data: np.ndarray,
+    palette: np.ndarray,
+    metric: Tuple[int, int, int],
+    matrix_name: str,
+    serpentine: bool,
+) -> np.ndarray:
+    """Quantize pixels in scan order, diffusing the error to their neighbors."""
+    offsets, factors = get_diffusion_map(matrix_name)
+
+    # Pixels depend on previously diffused errors, so this runs sequentially.
+    # Diffused values are clamped to 0-255 like the JS Uint8ClampedArray, so
+    # the kernel quantizes a uint8 copy in place. Alpha never takes part, so
+    # the copy holds only the RGB channels. ascontiguousarray would return a
+    # read-only view when the slice is already contiguous (1x1 or empty).
+    pixels = image_data[..., :3].copy()
+    diffuse_errors(
+        pixels,
+        palette,
+        np.array(metric, dtype=np.int32),
+        get_palette_lut(palette, metric),
+        offsets,
+        fixed_point_weights(factors),
+        serpentine,
+    )
+    result = np.empty_like(image_data)
+    result[..., :3] = pixels
+    result[..., 3] = 255
+    return result
+
+
 def dither_image(
     source_image: Image.Image,
     options: Optional[Dict[str, Any]] = None,
@@ -148,9 +257,13 @@ def dither_image(
         options: Dithering options dictionary with keys:
             - ditheringType: 'errorDiffusion', 'ordered', 'random', or 'quantizationOnly'
             - errorDiffusionMatrix: 'floydSteinberg', 'jarvis', 'stucki', etc.
+            - serpentine: walk every other row right to left (error diffusion)
             - orderedDitheringMatrix: [width, height] of Bayer matrix
             - randomDitheringType: 'rgb' or 'blackAndWhite'
             - palette: palette name or list of hex colors
+            - distanceMetric: 'euclidean' or 'weighted' (2R, 4G, 3B) color distance
+            - backend: 'cpu', or 'cuda' to run quantization and ordered dithering
+              on the GPU with cupy (falls back to 'cpu' if cupy is missing)
 
     Returns:
         A new PIL Image with dithering applied
@@ -165,83 +278,39 @@ def dither_image(
     if source_image.mode != "RGBA":
         source_image = source_image.convert("RGBA")
 
-    # Get image data as numpy array
-    width, height = source_image.size
-    image_data = np.array(source_image, dtype=np.float64).flatten()
+    # Get image data as an (H, W, 4) uint8 array; each mode returns a new one
+    image_data = np.asarray(source_image, dtype=np.uint8)
 
     # Set up color palette
-    color_palette = set_color_palette(opts["palette"])
-
-    # Create threshold map for ordered dithering
-    threshold_map = create_bayer_matrix(
-        (opts["orderedDitheringMatrix"][0], opts["orderedDitheringMatrix"][1])
+    palette_option = opts["palette"]
+    palette = _palette_array(
+        palette_option if isinstance(palette_option, str) else tuple(palette_option)
     )
 
-    # Process each pixel
-    for current in range(0, len(image_data), 4):
-        current_pixel = current
-        old_pixel = get_pixel_color_values(current_pixel, image_data)
-
-        # Quantization only
-        if not opts["ditheringType"] or opts["ditheringType"] == "quantizationOnly":
-            new_pixel = find_closest_palette_color(old_pixel, color_palette)
-            set_pixel(image_data, current_pixel, new_pixel)
-
-        # Random dithering - RGB mode
-        if opts["ditheringType"] == "random" and opts["randomDitheringType"] == "rgb":
-            new_pixel = random_dither_pixel_value(old_pixel)
-            set_pixel(image_data, current_pixel, new_pixel)
-
-        # Random dithering - Black and White mode
-        if (
-            opts["ditheringType"] == "random"
-            and opts["randomDitheringType"] == "blackAndWhite"
-        ):
-            new_pixel = random_dither_black_and_white_pixel_value(old_pixel)
-            set_pixel(image_data, current_pixel, new_pixel)
-
-        # Ordered dithering
-        if opts["ditheringType"] == "ordered":
-            ordered_dither_threshold = 256 / 4
-            new_pixel = ordered_dither_pixel_value(
-                old_pixel,
-                pixel_xy(current_pixel // 4, width),
-                threshold_map,
-                ordered_dither_threshold,
-            )
-            new_pixel = find_closest_palette_color(new_pixel, color_palette)
-            set_pixel(image_data, current_pixel, new_pixel)
-
-        # Error diffusion dithering
-        if opts["ditheringType"] == "errorDiffusion":
-            diffusion_map = get_diffusion_map(opts["errorDiffusionMatrix"])
-            new_pixel = find_closest_palette_color(old_pixel, color_palette)
-            set_pixel(image_data, current_pixel, new_pixel)
-
-            quant_error = get_quant_error(old_pixel, new_pixel)
-
-            for diffusion in diffusion_map:
-                # Calculate current pixel's x,y coordinates
-                current_x = (current_pixel // 4) % width
-                current_y = (current_pixel // 4) // width
-
-                # Calculate target pixel's x,y coordinates
-                target_x = current_x + diffusion["offset"][0]
-                target_y = current_y + diffusion["offset"][1]
-
-                # Check if target pixel is within image bounds
-                if target_x < 0 or target_x >= width or target_y < 0 or target_y >= height:
-                    continue
-
-                pixel_index = (target_y * width + target_x) * 4
-                error_pixel = add_quant_error(
-                    get_pixel_color_values(pixel_index, image_data),
-                    quant_error,
-                    diffusion["factor"],
-                )
-                set_pixel(image_data, pixel_index, error_pixel)
+    metric = get_distance_weights(opts["distanceMetric"])
+    backend = opts["backend"]
+
+    dithering_type = opts["ditheringType"]
+    random_type = opts["randomDitheringType"]
+
+    if not dithering_type or dithering_type == "quantizationOnly":
+        image_data = _quantize(image_data, palette, metric, backend)
+    elif dithering_type == "random" and random_type == "rgb":
+        image_data = _random_dither_rgb(image_data)
+    elif dithering_type == "random" and random_type == "blackAndWhite":
+        image_data = _random_dither_black_and_white(image_data)
+    elif dithering_type == "ordered":
+        image_data = _ordered_dither(
+            image_data, palette, metric, opts["orderedDitheringMatrix"], backend
+        )
+    elif dithering_type == "errorDiffusion":
+        image_data = _error_diffusion_dither(
+            image_data,
+            palette,
+            metric,
+            opts["errorDiffusionMatrix"],
+            bool(opts["serpentine"]),
+        )
 
     # Convert back to PIL Image
-    image_data = np.clip(image_data, 0, 255).astype(np.uint8)
-    image_data = image_data.reshape((height, width, 4))
     return Image.fromarray(image_data, "RGBA")
@@ -0,0 +1,355 @@
+"""Error diffusion kernel, native or compiled with numba when available."""
+
+import numpy as np
+
+from .find_closest_color import LUT_AMBIGUOUS
+from .utilities import get_num_threads, njit, prange
+
+try:
+    from . import _ed_c
+except ImportError:
+    _ed_c = None
+
+# Diffusion weights are applied as integers scaled by 2**FIXED_POINT_BITS.
+# _ed_c.c defines the same value.
+FIXED_POINT_BITS = 15
+
+# Columns each row processes per step of the parallel wavefront kernel
+WAVEFRONT_BLOCK = 64
+
+
+def fixed_point_weights(factors: np.ndarray) -> np.ndarray:
+    """
+    Convert diffusion factors to fixed-point integer weights.
+
+    Args:
+        factors: Array of diffusion factors
+
+    Returns:
+        An int32 array of the factors scaled by 2**FIXED_POINT_BITS
+    """
+    scaled = np.asarray(factors, dtype=np.float64) * (1 << FIXED_POINT_BITS)
+    return np.round(scaled).astype(np.int32)
+
+
+@njit(cache=True)
+def _add_error(value: int, error: int, weight: int) -> int:
+    """
+    Add a weighted error to a channel value.
+
+    The sum is rounded half to even and clamped to 0-255, which is what
+    storing it in the Uint8ClampedArray of the JavaScript implementation does.
+    """
+    total = (value << FIXED_POINT_BITS) + error * weight
+    result = total >> FIXED_POINT_BITS
+    remainder = total - (result << FIXED_POINT_BITS)
+    half = 1 << (FIXED_POINT_BITS - 1)
+    if remainder > half or (remainder == half and result & 1):
+        result += 1
+    if result < 0:
+        return 0
+    if result > 255:
+        return 255
+    return result
+
+
+@njit(cache=True)
+def _kernel_geometry(offsets: np.ndarray, lut: np.ndarray):
+    """
+    Work out what the error diffusion kernels need to know about their inputs.
+
+    Both kernels share this, so they always agree on the neighborhood they
+    diffuse to, which their identical results depend on.
+
+    Args:
+        offsets: int8 array of shape (N, 2) holding [dx, dy] per neighbor
+        lut: Lookup table from get_palette_lut
+
+    Returns:
+        The neighbor x and y offsets as int64 arrays, the shift that maps a
+        channel value to its lookup table cell, and the largest horizontal
+        distance any neighbor is from the pixel
+    """
+    offset_x = offsets[:, 0].astype(np.int64)
+    offset_y = offsets[:, 1].astype(np.int64)
+
+    # Derive the cell size from the table itself rather than a module
+    # constant, which numba would freeze into its on-disk cache
+    lut_shift = 0
+    while (256 >> lut_shift) > lut.shape[0]:
+        lut_shift += 1
+
+    reach = 0
+    for n in range(offset_x.shape[0]):
+        reach = max(reach, abs(offset_x[n]))
+    return offset_x, offset_y, lut_shift, reach
+
+
+@njit(cache=True, boundscheck=False, inline="always")
+def _diffuse_pixel(
+    pixels: np.ndarray,
+    width: int,
+    height: int,
+    x: int,
+    y: int,
+    reverse: bool,
+    palette: np.ndarray,
+    channel_weights: np.ndarray,
+    lut: np.ndarray,
+    lut_shift: int,
+    lut_ambiguous: int,
+    offset_x: np.ndarray,
+    offset_y: np.ndarray,
+    steps: np.ndarray,
+    weights: np.ndarray,
+) -> None:
+    """Quantize one pixel of a flat (H * W, C) buffer and spread its error."""
+    index = y * width + x
+    r = int(pixels[index, 0])
+    g = int(pixels[index, 1])
+    b = int(pixels[index, 2])
+
+    # Closest palette color (first one wins on ties). Values are always
+    # 0-255 here, and the lookup table is exact wherever it is unambiguous.
+    closest = int(lut[r >> lut_shift, g >> lut_shift, b >> lut_shift])
+    if closest == lut_ambiguous:
+        closest = 0
+        closest_distance = 1 << 30
+        for k in range(palette.shape[0]):
+            dr = r - int(palette[k, 0])
+            dg = g - int(palette[k, 1])
+            db = b - int(palette[k, 2])
+            distance = (
+                int(channel_weights[0]) * dr * dr
+                + int(channel_weights[1]) * dg * dg
+                + int(channel_weights[2]) * db * db
+            )
+            if distance < closest_distance:
+                closest = k
+                closest_distance = distance
+                if distance == 0:
+                    break
+
+    new_r = int(palette[closest, 0])
+    new_g = int(palette[closest, 1])
+    new_b = int(palette[closest, 2])
+    pixels[index, 0] = new_r
+    pixels[index, 1] = new_g
+    pixels[index, 2] = new_b
+
+    error_r = r - new_r
+    error_g = g - new_g
+    error_b = b - new_b
+
+    for n in range(steps.shape[0]):
+        target_x = x - offset_x[n] if reverse else x + offset_x[n]
+        if target_x < 0 or target_x >= width or y + offset_y[n] >= height:
+            continue
+
+        target = index + steps[n]
+        weight = int(weights[n])
+        pixels[target, 0] = _add_error(int(pixels[target, 0]), error_r, weight)
+        pixels[target, 1] = _add_error(int(pixels[target, 1]), error_g, weight)
+        pixels[target, 2] = _add_error(int(pixels[target, 2]), error_b, weight)
+
+
+@njit(cache=True, boundscheck=False)
+def error_diffusion_kernel(
+    image: np.ndarray,
+    palette: np.ndarray,
+    channel_weights: np.ndarray,
+    lut: np.ndarray,
+    offsets: np.ndarray,
+    weights: np.ndarray,
+    serpentine: bool,
+    lut_ambiguous: int = LUT_AMBIGUOUS,
+) -> None:
+    """
+    Dither an image in place using error diffusion.
+
+    Each pixel is replaced by its closest palette color and the quantization
+    error is spread to the neighbors described by the diffusion kernel.
+    All arithmetic is done on integers. Channels stay interleaved because
+    every step reads and writes all three channels of the same few pixels,
+    which then share cache lines; separate channel planes are no faster.
+
+    Without serpentine scanning, rows are processed in pairs: the second row
+    trails the first by just enough pixels that every error it depends on has
+    already arrived, so its neighborhood is still in cache when it is read.
+    Every value receives its errors in the same order as a row-by-row scan,
+    so the result is identical.
+
+    Args:
+        image: C-contiguous uint8 array of shape (H, W, C), C >= 3, whose RGB
+            channels are modified in place
+        palette: Integer array of shape (K, 3)
+        channel_weights: Integer array of the 3 per-channel distance weights
+        lut: Lookup table for palette and channel_weights from get_palette_lut
+        offsets: int8 array of shape (N, 2) holding [dx, dy] per neighbor
+        weights: int32 array of shape (N,) from fixed_point_weights
+        serpentine: Walk odd rows right to left, mirroring the kernel
+        lut_ambiguous: Value of the lookup table cells that need a full search
+    """
+    height = image.shape[0]
+    width = image.shape[1]
+    pixels = image.reshape(height * width, image.shape[2])
+
+    offset_x, offset_y, lut_shift, reach = _kernel_geometry(offsets, lut)
+
+    # Neighbor offsets as flat pixel steps, plus the mirrored steps for
+    # right-to-left rows, so the inner loop needs no 2D index arithmetic
+    forward_steps = offset_y * width + offset_x
+    mirrored_steps = offset_y * width - offset_x
+
+    if serpentine:
+        for y in range(height):
+            reverse = y % 2 == 1
+            steps = mirrored_steps if reverse else forward_steps
+            for i in range(width):
+                x = width - 1 - i if reverse else i
+                _diffuse_pixel(
+                    pixels, width, height, x, y, reverse, palette, channel_weights,
+                    lut, lut_shift, lut_ambiguous, offset_x, offset_y, steps, weights,
+                )
+        return
+
+    # A pixel receives errors from at most `reach` columns to its right in
+    # the row above, and hands errors to the row below as far as `reach`
+    # columns to its left. Trailing by 2 * reach + 1 covers both.
+    lag = 2 * reach + 1
+
+    y = 0
+    while y + 1 < height:
+        for step in range(width + lag):
+            if step < width:
+                _diffuse_pixel(
+                    pixels, width, height, step, y, False,
+                    palette, channel_weights, lut, lut_shift, lut_ambiguous,
+                    offset_x, offset_y, forward_steps, weights,
+                )
+            if step >= lag:
+                _diffuse_pixel(
+                    pixels, width, height, step - lag, y + 1, False,
+                    palette, channel_weights, lut, lut_shift, lut_ambiguous,
+                    offset_x, offset_y, forward_steps, weights,
+                )
+        y += 2
+
+    if y < height:
+        for x in range(width):
+            _diffuse_pixel(
+                pixels, width, height, x, y, False,
+                palette, channel_weights, lut, lut_shift, lut_ambiguous,
+                offset_x, offset_y, forward_steps, weights,
+            )
+
+
+@njit(cache=True, boundscheck=False, parallel=True)
+def error_diffusion_wavefront(
+    image: np.ndarray,
+    palette: np.ndarray,
+    channel_weights: np.ndarray,
+    lut: np.ndarray,
+    offsets: np.ndarray,
+    weights: np.ndarray,
+    block: int = WAVEFRONT_BLOCK,
+    lut_ambiguous: int = LUT_AMBIGUOUS,
+) -> None:
+    """
+    Dither an image in place using error diffusion, with rows in parallel.
+
+    Rows are cut into blocks of columns, and each row trails the one above
+    it by enough blocks that every error it depends on has already arrived
+    and that no two rows touch the same pixels at the same time. All rows
+    that are in flight process one block per step, in parallel. Every value
+    receives its errors in the same order as a row-by-row scan, so the
+    result is identical to error_diffusion_kernel without serpentine.
+
+    Args:
+        image: C-contiguous uint8 array of shape (H, W, C), C >= 3, whose RGB
+            channels are modified in place
+        palette: Integer array of shape (K, 3)
+        channel_weights: Integer array of the 3 per-channel distance weights
+        lut: Lookup table for palette and channel_weights from get_palette_lut
+        offsets: int8 array of shape (N, 2) holding [dx, dy] per neighbor
+        weights: int32 array of shape (N,) from fixed_point_weights
+        block: Number of columns a row processes per step
+        lut_ambiguous: Value of the lookup table cells that need a full search
+    """
+    height = image.shape[0]
+    width = image.shape[1]
+    pixels = image.reshape(height * width, image.shape[2])
+
+    offset_x, offset_y, lut_shift, reach = _kernel_geometry(offsets, lut)
+    steps = offset_y * width + offset_x
+
+    # A row writes up to `reach` columns either side of its block into the
+    # rows below, so a row trailing by block + 2 * reach columns never
+    # overlaps the one above it and sees all of its errors in scan order.
+    delay = 1 + (2 * reach + block - 1) // block
+    blocks = (width + block - 1) // block
+
+    for step in range(blocks + (height - 1) * delay):
+        first = max(0, (step - blocks + delay) // delay)
+        last = min(height - 1, step // delay)
+        for y in prange(first, last + 1):
+            start = (step - y * delay) * block
+            for x in range(start, min(start + block, width)):
+                _diffuse_pixel(
+                    pixels, width, height, x, y, False,
+                    palette, channel_weights, lut, lut_shift, lut_ambiguous,
+                    offset_x, offset_y, steps, weights,
+                )
+
+
+def diffuse_errors(
+    image: np.ndarray,
+    palette: np.ndarray,
+    channel_weights: np.ndarray,
+    lut: np.ndarray,
+    offsets: np.ndarray,
+    weights: np.ndarray,
+    serpentine: bool,
+) -> None:
+    """
+    Dither an image in place with the fastest available kernel.
+
+    Scans that run top to bottom use error_diffusion_wavefront when numba
+    has more than one thread to run it on. Otherwise this uses the optional
+    C extension when it was built, or error_diffusion_kernel (compiled by
+    numba if it is installed). All of them produce identical results.
+
+    Args:
+        image: C-contiguous uint8 array of shape (H, W, C), C >= 3, whose RGB
+            channels are modified in place
+        palette: Integer array of shape (K, 3)
+        channel_weights: Integer array of the 3 per-channel distance weights
+        lut: Lookup table for palette and channel_weights from get_palette_lut
+        offsets: int8 array of shape (N, 2) holding [dx, dy] per neighbor
+        weights: int32 array of shape (N,) from fixed_point_weights
+        serpentine: Walk odd rows right to left, mirroring the kernel
+    """
+    # The sentinel is passed in rather than read as a global inside the
+    # kernels, which numba would freeze into its on-disk cache
+    if not serpentine and get_num_threads() > 1 and image.shape[1] > WAVEFRONT_BLOCK:
+        error_diffusion_wavefront(
+            image, palette, channel_weights, lut, offsets, weights,
+            WAVEFRONT_BLOCK, LUT_AMBIGUOUS,
+        )
+        return
+
+    if _ed_c is None:
+        error_diffusion_kernel(
+            image, palette, channel_weights, lut, offsets, weights, serpentine, LUT_AMBIGUOUS
+        )
+        return
+
+    _ed_c.error_diffusion_kernel(
+        image,
+        np.ascontiguousarray(palette, dtype=np.int16),
+        np.ascontiguousarray(channel_weights, dtype=np.int32),
+        np.ascontiguousarray(lut, dtype=np.uint8),
+        np.ascontiguousarray(offsets, dtype=np.int8),
+        np.ascontiguousarray(weights, dtype=np.int32),
+        bool(serpentine),
+    )
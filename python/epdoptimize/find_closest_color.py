@@ -1,58 +1,289 @@
 """Color quantization utilities for finding the closest palette color."""
 
+import functools
 import math
-from typing import List
+from typing import List, Tuple, Union
 
+import numpy as np
 
-def distance_in_color_space(color1: List[float], color2: List[float]) -> float:
+# The palette lookup table splits every channel into 2**LUT_BITS cells
+LUT_BITS = 6
+LUT_SHIFT = 8 - LUT_BITS
+# Marks lookup table cells whose pixels do not all share one closest color.
+# _ed_c.c defines the same value.
+LUT_AMBIGUOUS = 255
+
+# Per-channel (R, G, B) weights of the squared distance for each metric
+DISTANCE_METRICS = {
+    "euclidean": (1, 1, 1),
+    "weighted": (2, 4, 3),
+}
+EUCLIDEAN = DISTANCE_METRICS["euclidean"]
+
+
+def distance_sq(color1: List[float], color2: List[float]) -> float:
     """
-    Calculate the Euclidean distance between two colors in RGB space.
+    Calculate the squared Euclidean distance between two colors in RGB space.
+
+    Use this when only comparing distances; it orders colors the same way
+    as distance_in_color_space without taking a square root.
 
     Args:
         color1: First color as [R, G, B] or [R, G, B, A]
         color2: Second color as [R, G, B] or [R, G, B, A]
 
     Returns:
-        The Euclidean distance between the colors (ignores alpha)
+        The squared distance between the colors (ignores alpha)
     """
     r = color1[0] - color2[0]
     g = color1[1] - color2[1]
     b = color1[2] - color2[2]
 
-    return math.sqrt(r * r + g * g + b * b)
+    return r * r + g * g + b * b
+
+
+def distance_in_color_space(color1: List[float], color2: List[float]) -> float:
+    """
+    Calculate the Euclidean distance between two colors in RGB space.
+
+    Args:
+        color1: First color as [R, G, B] or [R, G, B, A]
+        color2: Second color as [R, G, B] or [R, G, B, A]
+
+    Returns:
+        The Euclidean distance between the colors (ignores alpha)
+    """
+    return math.sqrt(distance_sq(color1, color2))
 
 
-def find_closest_palette_color(pixel: List[float], color_palette: List[List[int]]) -> List[float]:
+def find_closest_palette_color(
+    pixel: List[float], color_palette: Union[List[List[int]], np.ndarray]
+) -> List[float]:
     """
     Find the closest color in the palette to the given pixel.
 
     Args:
         pixel: The pixel color as [R, G, B] or [R, G, B, A]
-        color_palette: List of palette colors as [[R, G, B], ...]
+        color_palette: Palette colors as [[R, G, B], ...] or a (K, 3) array
 
     Returns:
         The closest palette color as [R, G, B, A] (alpha is always 255)
     """
-    # Calculate distances to all palette colors
-    colors_with_distance = []
-    for color in color_palette:
-        colors_with_distance.append({
-            "distance": distance_in_color_space(color, pixel),
-            "color": list(color)  # Make a copy
-        })
-
-    # Find the closest color
-    closest_color = None
-    for color_entry in colors_with_distance:
-        if closest_color is None:
-            closest_color = color_entry
-        else:
-            if color_entry["distance"] < closest_color["distance"]:
-                closest_color = color_entry
+    palette = np.asarray(color_palette)
+
+    # Squared distances order the colors the same way as Euclidean ones
+    diff = palette[:, :3] - np.asarray(pixel[:3], dtype=np.float64)
+    closest = int(np.argmin((diff * diff).sum(axis=1)))
 
     # Ensure alpha value is present
-    result = closest_color["color"]
+    result = palette[closest].tolist()
     if len(result) < 4:
         result.append(255)
 
     return result
+
+
+def get_distance_weights(name: str) -> Tuple[int, int, int]:
+    """
+    Get the per-channel weights of a distance metric.
+
+    Args:
+        name: Metric name ('euclidean' or 'weighted')
+
+    Returns:
+        A tuple of (R, G, B) weights; unknown names give the Euclidean weights
+    """
+    return DISTANCE_METRICS.get(name, EUCLIDEAN)
+
+
+def palette_distances(
+    pixels: np.ndarray,
+    color_palette: np.ndarray,
+    weights: Tuple[int, int, int] = EUCLIDEAN,
+) -> np.ndarray:
+    """
+    Calculate the squared distance from every pixel to every palette color.
+
+    The square root is skipped; it does not change which color is closest.
+
+    Args:
+        pixels: Array of shape (..., 3) or (..., 4) holding pixel colors
+        color_palette: Array of shape (K, 3) holding palette colors
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        An array of shape (..., K) with the weighted squared distances
+    """
+    diff = pixels[..., None, :3] - color_palette[..., :3]
+    if diff.dtype.kind in "iu":
+        # Small integer types would overflow when squared
+        diff = diff.astype(np.int32)
+    return np.einsum("...kc,...kc,c->...k", diff, diff, np.asarray(weights, dtype=diff.dtype))
+
+
+def find_closest_palette_indices(
+    pixels: np.ndarray,
+    color_palette: np.ndarray,
+    weights: Tuple[int, int, int] = EUCLIDEAN,
+) -> np.ndarray:
+    """
+    Find the index of the closest palette color for every pixel at once.
+
+    Args:
+        pixels: Array of shape (..., 3) or (..., 4) holding pixel colors
+        color_palette: Array of shape (K, 3) holding palette colors
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        An integer array of shape (...) with the index of the closest palette
+        color. Ties resolve to the first palette entry, matching
+        find_closest_palette_color.
+    """
+    return np.argmin(palette_distances(pixels, color_palette, weights), axis=-1)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cupy():
+    """
+    Import cupy the first time the GPU backend is asked for.
+
+    cupy is optional and slow to import, so the package does not load it
+    until it is needed.
+
+    Returns:
+        The cupy module, or None if it is not installed
+    """
+    try:
+        import cupy
+    except ImportError:  # the GPU backend falls back to numpy
+        return None
+    return cupy
+
+
+def find_closest_palette_indices_gpu(
+    pixels: np.ndarray,
+    color_palette: np.ndarray,
+    weights: Tuple[int, int, int] = EUCLIDEAN,
+) -> np.ndarray:
+    """
+    Find the index of the closest palette color for every pixel on a CUDA GPU.
+
+    Runs the same broadcast search as find_closest_palette_indices with cupy.
+    Requires cupy; callers should check get_cupy() first.
+
+    Args:
+        pixels: Array of shape (..., 3) or (..., 4) holding pixel colors
+        color_palette: Array of shape (K, 3) holding palette colors
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        A numpy integer array of shape (...) with the index of the closest
+        palette color
+    """
+    cupy = get_cupy()
+    rgb = cupy.asarray(pixels[..., :3], dtype=cupy.float32)
+    colors = cupy.asarray(color_palette[..., :3], dtype=cupy.float32)
+    diff = rgb[..., None, :] - colors
+    distances = (diff * diff * cupy.asarray(weights, dtype=cupy.float32)).sum(axis=-1)
+    return cupy.asnumpy(cupy.argmin(distances, axis=-1))
+
+
+def build_palette_lut(
+    color_palette: np.ndarray, weights: Tuple[int, int, int] = EUCLIDEAN
+) -> np.ndarray:
+    """
+    Build a lookup table from quantized RGB cells to palette indices.
+
+    Each channel is split into 2**LUT_BITS cells. A cell stores a palette index
+    only if that color is the closest one for every pixel inside the cell.
+    Distance differences between two palette colors are linear in the pixel,
+    so this holds exactly when the color is closest at all eight cell corners.
+    Cells on a decision boundary store LUT_AMBIGUOUS and need a full search.
+
+    Args:
+        color_palette: Array of shape (K, 3) holding palette colors
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        A uint8 array of shape (2**LUT_BITS,) * 3
+    """
+    cells = 1 << LUT_BITS
+    if len(color_palette) >= LUT_AMBIGUOUS:
+        return np.full((cells, cells, cells), LUT_AMBIGUOUS, dtype=np.uint8)
+
+    corners = np.arange(cells + 1, dtype=np.float64) * (1 << LUT_SHIFT)
+    grid = np.stack(np.meshgrid(corners, corners, corners, indexing="ij"), axis=-1)
+    closest = find_closest_palette_indices(
+        grid, np.asarray(color_palette, dtype=np.float64), weights
+    )
+
+    lut = closest[:-1, :-1, :-1]
+    unambiguous = np.ones(lut.shape, dtype=bool)
+    for r in (0, 1):
+        for g in (0, 1):
+            for b in (0, 1):
+                unambiguous &= closest[r:cells + r, g:cells + g, b:cells + b] == lut
+
+    return np.where(unambiguous, lut, LUT_AMBIGUOUS).astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_palette_lut(
+    palette_key: Tuple[Tuple[int, ...], ...], weights: Tuple[int, int, int]
+) -> np.ndarray:
+    """Build and freeze the lookup table for a hashable palette."""
+    lut = build_palette_lut(np.asarray(palette_key), weights)
+    lut.setflags(write=False)
+    return lut
+
+
+def get_palette_lut(
+    color_palette: np.ndarray, weights: Tuple[int, int, int] = EUCLIDEAN
+) -> np.ndarray:
+    """
+    Get the (cached, read-only) lookup table for a palette.
+
+    Args:
+        color_palette: Array of shape (K, 3) holding palette colors
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        The lookup table built by build_palette_lut
+    """
+    return _cached_palette_lut(
+        tuple(map(tuple, np.asarray(color_palette).tolist())), tuple(weights)
+    )
+
+
+def lookup_palette_indices(
+    pixels: np.ndarray,
+    color_palette: np.ndarray,
+    lut: np.ndarray,
+    weights: Tuple[int, int, int] = EUCLIDEAN,
+) -> np.ndarray:
+    """
+    Find the closest palette index for every pixel using a lookup table.
+
+    Pixels in ambiguous cells or outside 0-255 fall back to
+    find_closest_palette_indices, so the result is always exact.
+
+    Args:
+        pixels: Array of shape (..., 3) or (..., 4) holding pixel colors
+        color_palette: Array of shape (K, 3) holding palette colors
+        lut: Lookup table for color_palette and weights from get_palette_lut
+        weights: Per-channel weights of the squared distance
+
+    Returns:
+        An integer array of shape (...) with the index of the closest palette color
+    """
+    rgb = pixels[..., :3]
+    cells = np.clip(rgb, 0, 255).astype(np.intp) >> LUT_SHIFT
+    indices = lut[cells[..., 0], cells[..., 1], cells[..., 2]].astype(np.intp)
+
+    fallback = (indices == LUT_AMBIGUOUS) | ((rgb < 0) | (rgb >= 256)).any(axis=-1)
+    if fallback.any():
+        indices[fallback] = find_closest_palette_indices(
+            rgb[fallback], color_palette, weights
+        )
+
+    return indices
@@ -1,39 +1,30 @@
 """Color replacement utilities for mapping dithered colors to device colors."""
 
-import re
 from typing import List
 
 import numpy as np
 from PIL import Image
 
+from .color_helpers import hex_to_rgb
 
-def hex_to_rgb(hex_color: str) -> List[int]:
-    """
-    Convert a hex color string to RGB values.
 
-    Handles both 3-digit and 6-digit hex formats.
+def _hex_or_raise(hex_color: str) -> List[int]:
+    """
+    Convert a hex color string to RGB values, raising on invalid input.
 
     Args:
         hex_color: A hex color string like '#fff' or '#ffffff'
 
     Returns:
         A list of [R, G, B] values (0-255)
+
+    Raises:
+        ValueError: If the string is not a valid hex color
     """
-    # Handle shorthand hex format
-    shorthand_match = re.match(
-        r"^#?([a-f\d])([a-f\d])([a-f\d])$", hex_color, re.IGNORECASE
-    )
-    if shorthand_match:
-        r, g, b = shorthand_match.groups()
-        hex_color = "#" + r + r + g + g + b + b
-
-    # Remove # and parse
-    hex_color = hex_color.lstrip("#")
-    return [
-        int(hex_color[0:2], 16),
-        int(hex_color[2:4], 16),
-        int(hex_color[4:6], 16),
-    ]
+    rgb = hex_to_rgb(hex_color)
+    if rgb is None:
+        raise ValueError(f"Invalid hex color: {hex_color!r}")
+    return rgb
 
 
 def replace_colors(
@@ -56,43 +47,26 @@ def replace_colors(
     if source_image.mode != "RGBA":
         source_image = source_image.convert("RGBA")
 
-    width, height = source_image.size
-    image_data = np.array(source_image, dtype=np.uint8).flatten()
+    image_data = np.array(source_image, dtype=np.uint8)
 
     # Convert colors to RGB
-    original_colors_rgb = [hex_to_rgb(color) for color in original_colors]
-    replace_colors_rgb = [hex_to_rgb(color) for color in replace_colors_list]
-
-    error_colors = 0
-
-    for i in range(0, len(image_data), 4):
-        # Find matching original color
-        color_rgb = None
-        color_index = -1
-
-        for idx, orig_color in enumerate(original_colors_rgb):
-            if (
-                image_data[i] == orig_color[0]
-                and image_data[i + 1] == orig_color[1]
-                and image_data[i + 2] == orig_color[2]
-            ):
-                color_rgb = orig_color
-                color_index = idx
-                break
-
-        if color_rgb is not None:
-            # Get the corresponding replacement color
-            if color_index < len(replace_colors_rgb):
-                color_map_rgb = replace_colors_rgb[color_index]
-                image_data[i] = color_map_rgb[0]
-                image_data[i + 1] = color_map_rgb[1]
-                image_data[i + 2] = color_map_rgb[2]
-            else:
-                # No matching replacement color - return early like JS version
-                return None
-        else:
-            error_colors += 1
+    original_colors_rgb = [_hex_or_raise(color) for color in original_colors]
+    replace_colors_rgb = [_hex_or_raise(color) for color in replace_colors_list]
+
+    # Pack RGB into one integer per pixel so colors can be matched in one pass
+    packed = _pack_rgb(image_data)
+    original_packed = _pack_rgb(np.array(original_colors_rgb, dtype=np.uint8).reshape(-1, 3))
+
+    matched, color_indices = _match_colors(packed, original_packed)
+
+    if color_indices.size and color_indices.max() >= len(replace_colors_rgb):
+        # No matching replacement color - return early like JS version
+        return None
+
+    replace_np = np.array(replace_colors_rgb, dtype=np.uint8).reshape(-1, 3)
+    image_data[..., :3][matched] = replace_np[color_indices]
 
+    error_colors = int(packed.size - np.count_nonzero(matched))
     if error_colors > 0:
         print(
             f"replaceColors: {error_colors} pixels were not replaced. "
@@ -100,5 +74,30 @@ def replace_colors(
         )
 
     # Convert back to PIL Image
-    image_data = image_data.reshape((height, width, 4))
     return Image.fromarray(image_data, "RGBA")
+
+
+def _match_colors(packed: np.ndarray, original_packed: np.ndarray):
+    """
+    Match packed pixel colors against packed original colors.
+
+    Returns:
+        A boolean mask of pixels that matched, and the index of the first
+        matching original color for each of those pixels
+    """
+    if original_packed.size == 0:
+        return np.zeros(packed.shape, dtype=bool), np.zeros(0, dtype=np.intp)
+
+    # A stable sort keeps the first of any duplicate colors in front, so
+    # searchsorted finds the same match as a linear scan would
+    order = np.argsort(original_packed, kind="stable")
+    sorted_packed = original_packed[order]
+    positions = np.minimum(np.searchsorted(sorted_packed, packed), len(order) - 1)
+    matched = sorted_packed[positions] == packed
+    return matched, order[positions[matched]]
+
+
+def _pack_rgb(colors: np.ndarray) -> np.ndarray:
+    """Pack the RGB channels of a (..., 3+) uint8 array into uint32 values."""
+    colors = colors.astype(np.uint32)
+    return (colors[..., 0] << 16) | (colors[..., 1] << 8) | colors[..., 2]
@@ -15,3 +15,24 @@ def random_integer(min_val: int, max_val: int) -> int:
         A random integer in the range [min_val, max_val]
     """
     return random.randint(min_val, max_val)
+
+
+try:
+    from numba import get_num_threads, njit, prange
+except ImportError:  # numba is optional; fall back to plain Python
+    prange = range
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit used when numba is not installed.
+
+        Supports both the bare ``@njit`` and the ``@njit(...)`` forms and
+        returns the decorated function unchanged.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+    def get_num_threads() -> int:
+        """Stand-in for numba.get_num_threads: plain Python runs one thread."""
+        return 1
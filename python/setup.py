@@ -0,0 +1,18 @@
+"""Build the optional native error diffusion kernel.
+
+Project metadata lives in pyproject.toml. The extension is optional: if it
+fails to compile, the package still installs and falls back to the Numba or
+pure Python kernel.
+"""
+
+from setuptools import Extension, setup
+
+setup(
+    ext_modules=[
+        Extension(
+            "epdoptimize._ed_c",
+            sources=["epdoptimize/_ed_c.c"],
+            optional=True,
+        )
+    ],
+)
@@ -1,7 +1,86 @@
 """Pytest configuration and fixtures."""
 
+import functools
+import json
 import os
 import sys
 
+import pytest
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; it only speeds up fixture loading
+    orjson = None
+
 # Add the parent directory to the path so we can import epdoptimize
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# List the generated fixtures once instead of checking each file separately
+_AVAILABLE_FIXTURES = (
+    frozenset(entry.name for entry in os.scandir(FIXTURES_DIR) if entry.is_file())
+    if os.path.isdir(FIXTURES_DIR)
+    else frozenset()
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_fixture(filename):
+    """Parse a fixture file once, or return None if it has not been generated."""
+    if filename not in _AVAILABLE_FIXTURES:
+        return None
+    with open(os.path.join(FIXTURES_DIR, filename), "rb") as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def load_js_fixture(filename, generator="node tests/generate-fixtures.js"):
+    """Load a JavaScript fixture file, skipping the test if it is missing."""
+    fixtures = _read_fixture(filename)
+    if fixtures is None:
+        pytest.skip(f"Fixtures not generated. Run: {generator}")
+    return fixtures
+
+
+# Test arguments that are parametrized with one case per fixture entry
+_CASE_FIXTURES = {
+    "bayer_matrix_case": "bayer_matrix.json",
+    "hex_to_rgb_case": "hex_to_rgb.json",
+    "quant_error_case": "quant_error.json",
+    "add_quant_error_case": "add_quant_error.json",
+    "pixel_xy_case": "pixel_xy.json",
+    "ordered_dither_case": "ordered_dither.json",
+    "find_closest_color_case": "find_closest_color.json",
+    "image_case": "image_processing.json",
+}
+
+
+def pytest_generate_tests(metafunc):
+    """Run tests that take a *_case argument once per JavaScript fixture entry.
+
+    Each case is its own test, so failures are reported separately and the
+    cases can be spread over workers. Missing fixture files give an empty
+    parameter set, which pytest reports as skipped.
+    """
+    for argname, filename in _CASE_FIXTURES.items():
+        if argname in metafunc.fixturenames:
+            metafunc.parametrize(
+                argname,
+                _read_fixture(filename) or [],
+                ids=lambda case: case.get("name") if isinstance(case, dict) else None,
+            )
+
+
+@pytest.fixture(scope="session")
+def diffusion_map_fixtures():
+    """JavaScript fixtures for the diffusion maps."""
+    return load_js_fixture("diffusion_maps.json")
+
+
+@pytest.fixture(scope="session")
+def image_fixtures():
+    """JavaScript fixtures of whole dithered images."""
+    return load_js_fixture(
+        "image_processing.json", "npx tsx tests/generate-image-fixtures.js"
+    )
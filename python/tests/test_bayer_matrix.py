@@ -1,34 +1,17 @@
 """Unit tests for bayer_matrix module, comparing with JavaScript implementation."""
 
-import json
-import os
-import pytest
-
-from epdoptimize.bayer_matrix import create_bayer_matrix
-
-
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+from epdoptimize.bayer_matrix import create_bayer_matrix, get_bayer_matrix
 
 
 class TestBayerMatrix:
     """Test create_bayer_matrix function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "bayer_matrix.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_bayer_matrix_matches_javascript(self, js_fixtures):
+    def test_bayer_matrix_matches_javascript(self, bayer_matrix_case):
         """Test that create_bayer_matrix produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            size = tuple(fixture["input"])
-            expected = fixture["output"]
-            result = create_bayer_matrix(size)
-            assert result == expected, f"create_bayer_matrix({size}): expected {expected}, got {result}"
+        size = tuple(bayer_matrix_case["input"])
+        expected = bayer_matrix_case["output"]
+        result = create_bayer_matrix(size)
+        assert result == expected, f"create_bayer_matrix({size}): expected {expected}, got {result}"
 
     def test_1x1_matrix(self):
         """Test 1x1 Bayer matrix."""
@@ -77,3 +60,25 @@ class TestBayerMatrix:
         result = create_bayer_matrix((10, 10))
         assert len(result) == 8
         assert len(result[0]) == 8
+
+    def test_returns_independent_copies(self):
+        """Test that mutating a returned matrix does not affect later calls."""
+        first = create_bayer_matrix((4, 4))
+        first[0][0] = 99
+        assert create_bayer_matrix((4, 4))[0][0] == 0
+
+
+class TestGetBayerMatrix:
+    """Test the cached get_bayer_matrix accessor."""
+
+    def test_matches_create_bayer_matrix(self, bayer_matrix_case):
+        """Test that the array holds the same values as the list version."""
+        size = tuple(bayer_matrix_case["input"])
+        assert get_bayer_matrix(size).tolist() == create_bayer_matrix(size)
+
+    def test_is_cached_and_read_only(self):
+        """Test that each size is built once and cannot be modified."""
+        matrix = get_bayer_matrix((4, 4))
+        assert get_bayer_matrix((4, 4)) is matrix
+        assert get_bayer_matrix((12, 4)) is get_bayer_matrix((8, 4))
+        assert not matrix.flags.writeable
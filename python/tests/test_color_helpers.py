@@ -1,34 +1,17 @@
 """Unit tests for color_helpers module, comparing with JavaScript implementation."""
 
-import json
-import os
-import pytest
-
 from epdoptimize.color_helpers import hex_to_rgb
 
 
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
-
-
 class TestHexToRgb:
     """Test hex_to_rgb function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "hex_to_rgb.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_hex_to_rgb_matches_javascript(self, js_fixtures):
+    def test_hex_to_rgb_matches_javascript(self, hex_to_rgb_case):
         """Test that hex_to_rgb produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            hex_input = fixture["input"]
-            expected = fixture["output"]
-            result = hex_to_rgb(hex_input)
-            assert result == expected, f"hex_to_rgb('{hex_input}'): expected {expected}, got {result}"
+        hex_input = hex_to_rgb_case["input"]
+        expected = hex_to_rgb_case["output"]
+        result = hex_to_rgb(hex_input)
+        assert result == expected, f"hex_to_rgb('{hex_input}'): expected {expected}, got {result}"
 
     def test_shorthand_hex(self):
         """Test 3-digit hex colors."""
@@ -61,3 +44,9 @@ class TestHexToRgb:
         assert hex_to_rgb("invalid") is None
         assert hex_to_rgb("#gg0000") is None
         assert hex_to_rgb("#12345") is None  # 5 digits
+
+    def test_returns_independent_copies(self):
+        """Test that mutating a result does not affect cached values."""
+        first = hex_to_rgb("#123456")
+        first[0] = 0
+        assert hex_to_rgb("#123456") == [18, 52, 86]
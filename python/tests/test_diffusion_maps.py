@@ -1,9 +1,5 @@
 """Unit tests for diffusion_maps module, comparing with JavaScript implementation."""
 
-import json
-import os
-import pytest
-
 from epdoptimize.diffusion_maps import (
     floyd_steinberg,
     false_floyd_steinberg,
@@ -14,11 +10,12 @@ from epdoptimize.diffusion_maps import (
     sierra2,
     sierra2_4a,
     get_diffusion_map,
+    get_diffusion_map_entries,
+    DIFFUSION_KERNELS,
     DIFFUSION_MAPS,
 )
 
-
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+import numpy as np
 
 
 def approx_equal_map(map1, map2, tolerance=1e-10):
@@ -36,61 +33,52 @@ def approx_equal_map(map1, map2, tolerance=1e-10):
 class TestDiffusionMaps:
     """Test diffusion maps against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "diffusion_maps.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_floyd_steinberg_matches_javascript(self, js_fixtures):
+    def test_floyd_steinberg_matches_javascript(self, diffusion_map_fixtures):
         """Test Floyd-Steinberg kernel matches JavaScript."""
         result = floyd_steinberg()
-        expected = js_fixtures["floydSteinberg"]
+        expected = diffusion_map_fixtures["floydSteinberg"]
         assert approx_equal_map(result, expected)
 
-    def test_false_floyd_steinberg_matches_javascript(self, js_fixtures):
+    def test_false_floyd_steinberg_matches_javascript(self, diffusion_map_fixtures):
         """Test False Floyd-Steinberg kernel matches JavaScript."""
         result = false_floyd_steinberg()
-        expected = js_fixtures["falseFloydSteinberg"]
+        expected = diffusion_map_fixtures["falseFloydSteinberg"]
         assert approx_equal_map(result, expected)
 
-    def test_jarvis_matches_javascript(self, js_fixtures):
+    def test_jarvis_matches_javascript(self, diffusion_map_fixtures):
         """Test Jarvis kernel matches JavaScript."""
         result = jarvis()
-        expected = js_fixtures["jarvis"]
+        expected = diffusion_map_fixtures["jarvis"]
         assert approx_equal_map(result, expected)
 
-    def test_stucki_matches_javascript(self, js_fixtures):
+    def test_stucki_matches_javascript(self, diffusion_map_fixtures):
         """Test Stucki kernel matches JavaScript."""
         result = stucki()
-        expected = js_fixtures["stucki"]
+        expected = diffusion_map_fixtures["stucki"]
         assert approx_equal_map(result, expected)
 
-    def test_burkes_matches_javascript(self, js_fixtures):
+    def test_burkes_matches_javascript(self, diffusion_map_fixtures):
         """Test Burkes kernel matches JavaScript."""
         result = burkes()
-        expected = js_fixtures["burkes"]
+        expected = diffusion_map_fixtures["burkes"]
         assert approx_equal_map(result, expected)
 
-    def test_sierra3_matches_javascript(self, js_fixtures):
+    def test_sierra3_matches_javascript(self, diffusion_map_fixtures):
         """Test Sierra-3 kernel matches JavaScript."""
         result = sierra3()
-        expected = js_fixtures["sierra3"]
+        expected = diffusion_map_fixtures["sierra3"]
         assert approx_equal_map(result, expected)
 
-    def test_sierra2_matches_javascript(self, js_fixtures):
+    def test_sierra2_matches_javascript(self, diffusion_map_fixtures):
         """Test Sierra-2 kernel matches JavaScript."""
         result = sierra2()
-        expected = js_fixtures["sierra2"]
+        expected = diffusion_map_fixtures["sierra2"]
         assert approx_equal_map(result, expected)
 
-    def test_sierra2_4a_matches_javascript(self, js_fixtures):
+    def test_sierra2_4a_matches_javascript(self, diffusion_map_fixtures):
         """Test Sierra-2-4A kernel matches JavaScript."""
         result = sierra2_4a()
-        expected = js_fixtures["Sierra2-4A"]
+        expected = diffusion_map_fixtures["Sierra2-4A"]
         assert approx_equal_map(result, expected)
 
     def test_factors_sum_reasonable(self):
@@ -99,19 +87,37 @@ class TestDiffusionMaps:
         Note: Some algorithms like Jarvis intentionally don't sum to exactly 1.0.
         Jarvis sums to 47/48 ≈ 0.979, which matches the JavaScript implementation.
         """
-        for name, func in DIFFUSION_MAPS.items():
-            diffusion_map = func()
-            total = sum(entry["factor"] for entry in diffusion_map)
+        for name, (offsets, factors) in DIFFUSION_MAPS.items():
+            total = float(factors.sum())
             assert 0.75 <= total <= 1.01, f"{name}: factors sum to {total}, expected 0.75-1.0"
 
     def test_get_diffusion_map_valid(self):
         """Test get_diffusion_map returns correct map for valid names."""
-        assert get_diffusion_map("floydSteinberg") == floyd_steinberg()
-        assert get_diffusion_map("jarvis") == jarvis()
-        assert get_diffusion_map("Sierra2-4A") == sierra2_4a()
+        assert get_diffusion_map("floydSteinberg") is DIFFUSION_MAPS["floydSteinberg"]
+        assert get_diffusion_map("jarvis") is DIFFUSION_MAPS["jarvis"]
+        assert get_diffusion_map("Sierra2-4A") is DIFFUSION_MAPS["Sierra2-4A"]
 
     def test_get_diffusion_map_invalid_defaults_to_floyd_steinberg(self):
         """Test get_diffusion_map defaults to Floyd-Steinberg for invalid names."""
         result = get_diffusion_map("nonexistent")
-        expected = floyd_steinberg()
-        assert result == expected
+        expected = get_diffusion_map("floydSteinberg")
+        assert result is expected
+
+    def test_diffusion_arrays_match_kernels(self):
+        """Test that the array form holds the same offsets and factors as each kernel."""
+        for name, func in DIFFUSION_KERNELS.items():
+            offsets, factors = DIFFUSION_MAPS[name]
+            diffusion_map = func()
+            assert offsets.dtype == np.int8
+            assert factors.dtype == np.float32
+            assert offsets.tolist() == [entry["offset"] for entry in diffusion_map]
+            np.testing.assert_allclose(
+                factors, [entry["factor"] for entry in diffusion_map], rtol=1e-7
+            )
+            assert not offsets.flags.writeable
+            assert not factors.flags.writeable
+
+    def test_get_diffusion_map_entries(self):
+        """Test the dictionary form of get_diffusion_map."""
+        assert get_diffusion_map_entries("jarvis") == jarvis()
+        assert get_diffusion_map_entries("nonexistent") == floyd_steinberg()
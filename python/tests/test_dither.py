@@ -1,9 +1,5 @@
 """Unit tests for dither module, comparing with JavaScript implementation."""
 
-import json
-import os
-import pytest
-
 from epdoptimize.dither import (
     get_pixel_color_values,
     get_quant_error,
@@ -17,9 +13,6 @@ from epdoptimize.bayer_matrix import create_bayer_matrix
 import numpy as np
 
 
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
-
-
 class TestGetPixelColorValues:
     """Test get_pixel_color_values function."""
 
@@ -36,23 +29,13 @@ class TestGetPixelColorValues:
 class TestQuantError:
     """Test quant error calculations against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "quant_error.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_quant_error_matches_javascript(self, js_fixtures):
+    def test_quant_error_matches_javascript(self, quant_error_case):
         """Test that get_quant_error produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            old_pixel = fixture["input"]["oldPixel"]
-            new_pixel = fixture["input"]["newPixel"]
-            expected = fixture["output"]
-            result = get_quant_error(old_pixel, new_pixel)
-            assert result == expected, f"get_quant_error: expected {expected}, got {result}"
+        old_pixel = quant_error_case["input"]["oldPixel"]
+        new_pixel = quant_error_case["input"]["newPixel"]
+        expected = quant_error_case["output"]
+        result = get_quant_error(old_pixel, new_pixel)
+        assert result == expected, f"get_quant_error: expected {expected}, got {result}"
 
     def test_no_error_same_pixels(self):
         """Test that identical pixels have zero error."""
@@ -78,48 +61,28 @@ class TestQuantError:
 class TestAddQuantError:
     """Test add_quant_error function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "add_quant_error.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_add_quant_error_matches_javascript(self, js_fixtures):
+    def test_add_quant_error_matches_javascript(self, add_quant_error_case):
         """Test that add_quant_error produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            pixel = fixture["input"]["pixel"]
-            quant_error = fixture["input"]["quantError"]
-            factor = fixture["input"]["factor"]
-            expected = fixture["output"]
-            result = add_quant_error(pixel, quant_error, factor)
-            for i in range(len(result)):
-                assert abs(result[i] - expected[i]) < 0.0001, \
-                    f"add_quant_error: expected {expected}, got {result}"
+        pixel = add_quant_error_case["input"]["pixel"]
+        quant_error = add_quant_error_case["input"]["quantError"]
+        factor = add_quant_error_case["input"]["factor"]
+        expected = add_quant_error_case["output"]
+        result = add_quant_error(pixel, quant_error, factor)
+        for i in range(len(result)):
+            assert abs(result[i] - expected[i]) < 0.0001, \
+                f"add_quant_error: expected {expected}, got {result}"
 
 
 class TestPixelXY:
     """Test pixel_xy function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "pixel_xy.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_pixel_xy_matches_javascript(self, js_fixtures):
+    def test_pixel_xy_matches_javascript(self, pixel_xy_case):
         """Test that pixel_xy produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            index = fixture["input"]["index"]
-            width = fixture["input"]["width"]
-            expected = fixture["output"]
-            result = pixel_xy(index, width)
-            assert result == expected, f"pixel_xy({index}, {width}): expected {expected}, got {result}"
+        index = pixel_xy_case["input"]["index"]
+        width = pixel_xy_case["input"]["width"]
+        expected = pixel_xy_case["output"]
+        result = pixel_xy(index, width)
+        assert result == expected, f"pixel_xy({index}, {width}): expected {expected}, got {result}"
 
     def test_first_pixel(self):
         """Test first pixel is at (0, 0)."""
@@ -137,30 +100,20 @@ class TestPixelXY:
 class TestOrderedDitherPixelValue:
     """Test ordered_dither_pixel_value function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "ordered_dither.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_ordered_dither_matches_javascript(self, js_fixtures):
+    def test_ordered_dither_matches_javascript(self, ordered_dither_case):
         """Test that ordered_dither_pixel_value produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            pixel = fixture["input"]["pixel"]
-            coordinates = fixture["input"]["coordinates"]
-            matrix_size = tuple(fixture["input"]["matrixSize"])
-            threshold = fixture["input"]["threshold"]
-            expected = fixture["output"]
-
-            threshold_map = create_bayer_matrix(matrix_size)
-            result = ordered_dither_pixel_value(pixel, coordinates, threshold_map, threshold)
-
-            for i in range(len(result)):
-                assert abs(result[i] - expected[i]) < 0.0001, \
-                    f"ordered_dither_pixel_value: expected {expected}, got {result}"
+        pixel = ordered_dither_case["input"]["pixel"]
+        coordinates = ordered_dither_case["input"]["coordinates"]
+        matrix_size = tuple(ordered_dither_case["input"]["matrixSize"])
+        threshold = ordered_dither_case["input"]["threshold"]
+        expected = ordered_dither_case["output"]
+
+        threshold_map = create_bayer_matrix(matrix_size)
+        result = ordered_dither_pixel_value(pixel, coordinates, threshold_map, threshold)
+
+        for i in range(len(result)):
+            assert abs(result[i] - expected[i]) < 0.0001, \
+                f"ordered_dither_pixel_value: expected {expected}, got {result}"
 
 
 class TestSetColorPalette:
@@ -0,0 +1,225 @@
+"""Unit tests for the error_diffusion kernel."""
+
+import numpy as np
+import pytest
+
+from epdoptimize.diffusion_maps import DIFFUSION_MAPS
+from epdoptimize.error_diffusion import (
+    FIXED_POINT_BITS,
+    _add_error,
+    _ed_c,
+    error_diffusion_kernel,
+    error_diffusion_wavefront,
+    fixed_point_weights,
+)
+from epdoptimize.find_closest_color import LUT_AMBIGUOUS, get_palette_lut
+
+
+FLOYD_STEINBERG_OFFSETS = np.array([[1, 0], [-1, 1], [0, 1], [1, 1]], dtype=np.int8)
+FLOYD_STEINBERG_FACTORS = fixed_point_weights([7 / 16, 3 / 16, 5 / 16, 1 / 16])
+BLACK_WHITE = np.array([[0, 0, 0], [255, 255, 255]], dtype=np.int16)
+BLACK_WHITE_LUT = get_palette_lut(BLACK_WHITE)
+EUCLIDEAN = np.ones(3, dtype=np.int32)
+
+
+def create_gray_image(width, height, gray):
+    """Create a uint8 RGBA work buffer filled with one gray level."""
+    image = np.full((height, width, 4), gray, dtype=np.uint8)
+    image[..., 3] = 255
+    return image
+
+
+def dither_black_white(image, serpentine):
+    """Run the kernel on an image with the black and white palette and Floyd-Steinberg."""
+    error_diffusion_kernel(
+        image,
+        BLACK_WHITE,
+        EUCLIDEAN,
+        BLACK_WHITE_LUT,
+        FLOYD_STEINBERG_OFFSETS,
+        FLOYD_STEINBERG_FACTORS,
+        serpentine,
+    )
+
+
+class TestErrorDiffusionKernel:
+    """Test error_diffusion_kernel function."""
+
+    def test_outputs_palette_colors(self):
+        """Test that every pixel ends up as a palette color."""
+        image = create_gray_image(8, 8, 100)
+        dither_black_white(image, False)
+        assert set(np.unique(image[..., :3])) <= {0, 255}
+        assert (image[..., 3] == 255).all()
+
+    def test_rgb_buffer_matches_rgba(self):
+        """Test that alpha is left alone, so an RGB buffer gives the same colors."""
+        rng = np.random.default_rng(5)
+        rgba = create_gray_image(9, 6, 0)
+        rgba[..., :3] = rng.integers(0, 256, (6, 9, 3))
+        rgba[..., 3] = 7
+        rgb = np.ascontiguousarray(rgba[..., :3])
+
+        dither_black_white(rgba, False)
+        dither_black_white(rgb, False)
+        np.testing.assert_array_equal(rgba[..., :3], rgb)
+        assert (rgba[..., 3] == 7).all()
+
+    def test_diffuses_error_to_neighbors(self):
+        """Test that the quantization error is pushed onto the next pixel."""
+        image = create_gray_image(3, 1, 140)
+        image[0, 0, :3] = 200
+
+        # 200 -> white (error -55), so the neighbor drops to 140 - 55 * 7/16 -> black
+        dither_black_white(image, False)
+        assert (image[0, 0, :3] == 255).all()
+        assert (image[0, 1, :3] == 0).all()
+
+    def test_serpentine_mirrors_odd_rows(self):
+        """Test that serpentine scanning mirrors the result of a mirrored image."""
+        rng = np.random.default_rng(1)
+        source = create_gray_image(7, 1, 0)
+        source[0, :, :3] = rng.integers(0, 256, (7, 1))
+        # Second row is processed right to left, so mirror it and compare
+        image = np.concatenate([create_gray_image(7, 1, 0), source[:, ::-1]], axis=0)
+        serpentine = image.copy()
+        dither_black_white(serpentine, True)
+
+        expected = source.copy()
+        dither_black_white(expected, False)
+        np.testing.assert_array_equal(serpentine[1, ::-1], expected[0])
+
+    def test_lookup_table_matches_full_search(self):
+        """Test that using the lookup table gives the same result as searching every color."""
+        rng = np.random.default_rng(3)
+        image = create_gray_image(19, 13, 0)
+        image[..., :3] = rng.integers(0, 256, (13, 19, 3))
+        palette = np.array(
+            [[0, 0, 0], [255, 255, 255], [200, 30, 30], [20, 180, 60], [40, 40, 210]],
+            dtype=np.int16,
+        )
+        lut = get_palette_lut(palette)
+        no_lut = np.full_like(lut, LUT_AMBIGUOUS)
+
+        expected = image.copy()
+        for buffer, table in ((expected, no_lut), (image, lut)):
+            error_diffusion_kernel(
+                buffer, palette, EUCLIDEAN, table,
+                FLOYD_STEINBERG_OFFSETS, FLOYD_STEINBERG_FACTORS, False,
+            )
+        np.testing.assert_array_equal(image, expected)
+
+    def test_uses_given_ambiguous_marker(self):
+        """Test that the kernels compare table cells with the marker they are passed."""
+        rng = np.random.default_rng(4)
+        image = create_gray_image(19, 13, 0)
+        image[..., :3] = rng.integers(0, 256, (13, 19, 3))
+        marker = 7
+        no_lut = np.full_like(BLACK_WHITE_LUT, marker)
+
+        expected = image.copy()
+        dither_black_white(expected, False)
+        serial = image.copy()
+        error_diffusion_kernel(
+            serial, BLACK_WHITE, EUCLIDEAN, no_lut,
+            FLOYD_STEINBERG_OFFSETS, FLOYD_STEINBERG_FACTORS, False, marker,
+        )
+        error_diffusion_wavefront(
+            image, BLACK_WHITE, EUCLIDEAN, no_lut,
+            FLOYD_STEINBERG_OFFSETS, FLOYD_STEINBERG_FACTORS, 4, marker,
+        )
+        np.testing.assert_array_equal(serial, expected)
+        np.testing.assert_array_equal(image, expected)
+
+    def test_rounds_like_uint8_clamped_array(self):
+        """Test that diffused values are rounded half to even and clamped."""
+        weight = int(fixed_point_weights([7 / 16])[0])
+        assert _add_error(100, 8, weight) == 104  # 103.5
+        assert _add_error(101, 8, weight) == 104  # 104.5
+        assert _add_error(100, -8, weight) == 96  # 96.5
+        assert _add_error(250, 100, weight) == 255
+        assert _add_error(5, -100, weight) == 0
+
+    def test_fixed_point_weights_precision(self):
+        """Test that weights are exact for 1/16 steps and close for 1/48 steps."""
+        one = 1 << FIXED_POINT_BITS
+        np.testing.assert_array_equal(fixed_point_weights([7 / 16, 1 / 16]) * 16, [7 * one, one])
+
+        # Off by less than 1/256 of a level even for the largest error of 255
+        jarvis = fixed_point_weights([7 / 48])[0]
+        assert abs(jarvis / (1 << FIXED_POINT_BITS) - 7 / 48) * 255 < 1 / 256
+
+
+class TestErrorDiffusionWavefront:
+    """Test the row-parallel error_diffusion_wavefront kernel."""
+
+    @pytest.mark.parametrize("kernel", sorted(DIFFUSION_MAPS))
+    @pytest.mark.parametrize("block", [1, 4, 64])
+    def test_matches_row_by_row_kernel(self, kernel, block):
+        """Test that the wavefront order produces identical output."""
+        rng = np.random.default_rng(11)
+        image = create_gray_image(23, 17, 0)
+        image[..., :3] = rng.integers(0, 256, (17, 23, 3))
+        offsets, factors = DIFFUSION_MAPS[kernel]
+        weights = fixed_point_weights(factors)
+
+        expected = image.copy()
+        error_diffusion_kernel(
+            expected, BLACK_WHITE, EUCLIDEAN, BLACK_WHITE_LUT, offsets, weights, False
+        )
+        error_diffusion_wavefront(
+            image, BLACK_WHITE, EUCLIDEAN, BLACK_WHITE_LUT, offsets, weights, block
+        )
+        np.testing.assert_array_equal(image, expected)
+
+
+@pytest.mark.skipif(_ed_c is None, reason="native extension not built")
+class TestNativeErrorDiffusionKernel:
+    """Test the optional C error diffusion kernel."""
+
+    @pytest.mark.parametrize("kernel", sorted(DIFFUSION_MAPS))
+    @pytest.mark.parametrize("serpentine", [False, True])
+    @pytest.mark.parametrize("metric", [(1, 1, 1), (2, 4, 3)])
+    def test_matches_python_kernel(self, kernel, serpentine, metric):
+        """Test that the C kernel produces identical output to the Python kernel."""
+        rng = np.random.default_rng(7)
+        image = create_gray_image(23, 17, 0)
+        image[..., :3] = rng.integers(0, 256, (17, 23, 3))
+        palette = np.array(
+            [[0, 0, 0], [255, 255, 255], [255, 0, 0], [0, 200, 40], [30, 60, 220]],
+            dtype=np.int16,
+        )
+        offsets, factors = DIFFUSION_MAPS[kernel]
+        weights = fixed_point_weights(factors)
+
+        expected = image.copy()
+        lut = get_palette_lut(palette, metric)
+        channel_weights = np.array(metric, dtype=np.int32)
+        error_diffusion_kernel(
+            expected, palette, channel_weights, lut, offsets, weights, serpentine
+        )
+        _ed_c.error_diffusion_kernel(
+            image, palette, channel_weights, lut, offsets, weights, serpentine
+        )
+        np.testing.assert_array_equal(image, expected)
+
+    def test_matches_python_kernel_on_rgb_buffers(self):
+        """Test that the C kernel also handles buffers without an alpha channel."""
+        rng = np.random.default_rng(9)
+        image = rng.integers(0, 256, (11, 13, 3), dtype=np.uint8)
+        expected = image.copy()
+        dither_black_white(expected, True)
+        _ed_c.error_diffusion_kernel(
+            image, BLACK_WHITE, EUCLIDEAN, BLACK_WHITE_LUT,
+            FLOYD_STEINBERG_OFFSETS, FLOYD_STEINBERG_FACTORS, True,
+        )
+        np.testing.assert_array_equal(image, expected)
+
+    def test_rejects_wrong_dtype(self):
+        """Test that buffers with the wrong element size are rejected."""
+        image = create_gray_image(4, 4, 100).astype(np.int32)
+        with pytest.raises(ValueError):
+            _ed_c.error_diffusion_kernel(
+                image, BLACK_WHITE, EUCLIDEAN, BLACK_WHITE_LUT,
+                FLOYD_STEINBERG_OFFSETS, FLOYD_STEINBERG_FACTORS, False,
+            )
@@ -1,14 +1,21 @@
 """Unit tests for find_closest_color module, comparing with JavaScript implementation."""
 
-import json
 import math
-import os
-import pytest
-
-from epdoptimize.find_closest_color import find_closest_palette_color, distance_in_color_space
-
-
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+import numpy as np
+
+from epdoptimize.find_closest_color import (
+    LUT_AMBIGUOUS,
+    LUT_BITS,
+    build_palette_lut,
+    find_closest_palette_color,
+    find_closest_palette_indices,
+    distance_in_color_space,
+    distance_sq,
+    get_distance_weights,
+    get_palette_lut,
+    lookup_palette_indices,
+    palette_distances,
+)
 
 
 class TestDistanceInColorSpace:
@@ -42,26 +49,27 @@ class TestDistanceInColorSpace:
         assert distance_in_color_space(c1, c2) == distance_in_color_space(c2, c1)
 
 
+class TestDistanceSq:
+    """Test distance_sq function."""
+
+    def test_matches_squared_distance(self):
+        """Test that distance_sq is the square of distance_in_color_space."""
+        assert distance_sq([0, 0, 0], [255, 255, 255]) == 3 * 255**2
+        assert distance_sq([100, 150, 200, 255], [50, 100, 150, 0]) == 3 * 50**2
+        distance = distance_in_color_space([255, 0, 0], [0, 255, 0])
+        assert abs(distance_sq([255, 0, 0], [0, 255, 0]) - distance**2) < 0.001
+
+
 class TestFindClosestPaletteColor:
     """Test find_closest_palette_color function against JavaScript implementation."""
 
-    @pytest.fixture
-    def js_fixtures(self):
-        """Load JavaScript test fixtures."""
-        fixture_path = os.path.join(FIXTURES_DIR, "find_closest_color.json")
-        if not os.path.exists(fixture_path):
-            pytest.skip("Fixtures not generated. Run: node tests/generate-fixtures.js")
-        with open(fixture_path) as f:
-            return json.load(f)
-
-    def test_find_closest_matches_javascript(self, js_fixtures):
+    def test_find_closest_matches_javascript(self, find_closest_color_case):
         """Test that find_closest_palette_color produces identical results to JavaScript."""
-        for fixture in js_fixtures:
-            pixel = fixture["input"]["pixel"]
-            palette = fixture["input"]["palette"]
-            expected = fixture["output"]
-            result = find_closest_palette_color(pixel, palette)
-            assert result == expected, f"find_closest_palette_color({pixel}, ...): expected {expected}, got {result}"
+        pixel = find_closest_color_case["input"]["pixel"]
+        palette = find_closest_color_case["input"]["palette"]
+        expected = find_closest_color_case["output"]
+        result = find_closest_palette_color(pixel, palette)
+        assert result == expected, f"find_closest_palette_color({pixel}, ...): expected {expected}, got {result}"
 
     def test_exact_match(self):
         """Test finding an exact color match."""
@@ -93,3 +101,120 @@ class TestFindClosestPaletteColor:
         palette = [[0, 0, 0, 128]]  # Alpha present
         result = find_closest_palette_color([50, 50, 50, 255], palette)
         assert len(result) == 4
+
+    def test_ndarray_palette(self):
+        """Test that a NumPy palette gives the same plain-list result."""
+        palette = [[0, 0, 0], [255, 255, 255], [255, 0, 0]]
+        result = find_closest_palette_color([200, 30, 40, 255], np.asarray(palette, dtype=np.int16))
+        assert result == [255, 0, 0, 255]
+        assert all(type(value) is int for value in result)
+
+
+class TestPaletteDistances:
+    """Test the vectorized palette_distances function."""
+
+    def test_matches_scalar_distance(self):
+        """Test that every entry is the squared scalar distance."""
+        palette = np.array([[0, 0, 0], [255, 255, 255], [255, 0, 0]], dtype=np.int16)
+        rng = np.random.default_rng(4)
+        pixels = rng.integers(0, 256, (10, 4)).astype(np.uint8)
+
+        distances = palette_distances(pixels, palette)
+
+        assert distances.shape == (10, 3)
+        for n in range(10):
+            for k in range(3):
+                expected = distance_in_color_space(pixels[n].tolist(), palette[k].tolist())
+                assert distances[n, k] == round(expected ** 2)
+
+
+class TestFindClosestPaletteIndices:
+    """Test the vectorized find_closest_palette_indices function."""
+
+    def test_matches_scalar_search(self):
+        """Test that every pixel maps to the same color as the scalar search."""
+        palette = [[0, 0, 0], [255, 255, 255], [255, 0, 0], [0, 0, 255]]
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (8, 8, 4)).astype(np.float64)
+
+        indices = find_closest_palette_indices(pixels, np.asarray(palette, dtype=np.float64))
+
+        assert indices.shape == (8, 8)
+        for y in range(8):
+            for x in range(8):
+                expected = find_closest_palette_color(list(pixels[y, x]), palette)
+                assert palette[indices[y, x]] == expected[:3]
+
+    def test_ties_resolve_to_first_entry(self):
+        """Test that equidistant palette colors resolve to the first one."""
+        palette = np.array([[0, 0, 0], [255, 255, 255]], dtype=np.float64)
+        pixels = np.array([[127.5, 127.5, 127.5, 255]])
+        assert find_closest_palette_indices(pixels, palette)[0] == 0
+
+    def test_small_integer_types_do_not_overflow(self):
+        """Test that uint8 pixels against an int16 palette give the same result as floats."""
+        palette = np.array([[0, 0, 0], [255, 255, 255], [255, 0, 0]], dtype=np.int16)
+        rng = np.random.default_rng(1)
+        pixels = rng.integers(0, 256, (16, 16, 4)).astype(np.uint8)
+
+        expected = find_closest_palette_indices(
+            pixels.astype(np.float64), palette.astype(np.float64)
+        )
+        np.testing.assert_array_equal(find_closest_palette_indices(pixels, palette), expected)
+
+    def test_weighted_metric(self):
+        """Test that channel weights change which color is closest."""
+        palette = np.array([[100, 0, 0], [0, 80, 0]], dtype=np.int16)
+        pixels = np.zeros((1, 3), dtype=np.uint8)
+        assert find_closest_palette_indices(pixels, palette)[0] == 1
+        weighted = get_distance_weights("weighted")
+        assert find_closest_palette_indices(pixels, palette, weighted)[0] == 0
+
+    def test_unknown_metric_is_euclidean(self):
+        """Test that unknown metric names fall back to Euclidean weights."""
+        assert get_distance_weights("unknown") == get_distance_weights("euclidean") == (1, 1, 1)
+
+
+class TestPaletteLut:
+    """Test the palette lookup table helpers."""
+
+    PALETTE = np.array(
+        [[0, 0, 0], [255, 255, 255], [160, 32, 32], [32, 160, 32], [32, 32, 160]],
+        dtype=np.int16,
+    )
+
+    def test_lookup_matches_full_search(self):
+        """Test that table lookups agree with the full search, including out-of-range values."""
+        rng = np.random.default_rng(0)
+        pixels = rng.uniform(-20, 320, (5000, 3))
+        lut = build_palette_lut(self.PALETTE)
+
+        result = lookup_palette_indices(pixels, self.PALETTE, lut)
+        expected = find_closest_palette_indices(pixels, self.PALETTE)
+        np.testing.assert_array_equal(result, expected)
+
+    def test_weighted_lookup_matches_full_search(self):
+        """Test that tables built for a weighted metric stay exact."""
+        weights = get_distance_weights("weighted")
+        rng = np.random.default_rng(2)
+        pixels = rng.integers(0, 256, (5000, 3)).astype(np.float32)
+        lut = build_palette_lut(self.PALETTE, weights)
+
+        result = lookup_palette_indices(pixels, self.PALETTE, lut, weights)
+        expected = find_closest_palette_indices(pixels, self.PALETTE, weights)
+        np.testing.assert_array_equal(result, expected)
+
+    def test_boundary_cells_are_ambiguous(self):
+        """Test that cells split between two colors are marked ambiguous."""
+        lut = build_palette_lut(np.array([[0, 0, 0], [255, 255, 255]], dtype=np.int16))
+        assert lut[0, 0, 0] == 0
+        assert lut[-1, -1, -1] == 1
+        # The cell just below mid-gray straddles the 127.5 decision boundary
+        middle = (1 << LUT_BITS) // 2 - 1
+        assert lut[middle, middle, middle] == LUT_AMBIGUOUS
+
+    def test_lut_is_cached_and_read_only(self):
+        """Test that get_palette_lut reuses one frozen table per palette."""
+        lut = get_palette_lut(self.PALETTE)
+        assert get_palette_lut(self.PALETTE.copy()) is lut
+        assert not lut.flags.writeable
@@ -1,6 +1,8 @@
 """Integration tests for full dithering pipeline."""
 
-import os
+import functools
+import itertools
+
 import pytest
 import numpy as np
 from PIL import Image
@@ -11,47 +13,117 @@ from epdoptimize import (
     get_default_palettes,
     get_device_colors,
 )
-
-
-FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
-
-
-def create_test_image(width, height, pattern="gradient"):
-    """Create a test image with specified pattern."""
-    img = Image.new("RGBA", (width, height))
-    pixels = img.load()
+from epdoptimize.color_helpers import hex_to_rgb
+
+# The dithering tests look palettes up by name many times; the lookups are
+# pure, so each name is resolved once. The accessor tests use the originals.
+_cached_palette = functools.lru_cache(maxsize=None)(get_default_palettes)
+_cached_device_colors = functools.lru_cache(maxsize=None)(get_device_colors)
+
+# RGB colors of each named palette and device color set, parsed once
+PALETTE_NAMES = ("default", "gameboy", "spectra6", "acep")
+_PALETTE_RGB = {
+    name: frozenset(tuple(hex_to_rgb(c)) for c in get_default_palettes(name))
+    for name in PALETTE_NAMES
+}
+_DEVICE_RGB = {
+    name: frozenset(tuple(hex_to_rgb(c)) for c in get_device_colors(name))
+    for name in PALETTE_NAMES
+}
+
+# Every color whose channels are fully off or on
+PRIMARY_RGB = frozenset(itertools.product((0, 255), repeat=3))
+
+# Device colors swapped for black and white in the replacement tests
+BW_REPLACEMENT = ["#e6e6e6", "#212121"]
+_BW_REPLACEMENT_RGB = frozenset(tuple(hex_to_rgb(c)) for c in BW_REPLACEMENT)
+
+
+def create_test_image(width, height, pattern="gradient", mode="RGBA"):
+    """Create a test image with specified pattern, in "RGBA" or "RGB" mode."""
+    # The image maps the shared read-only array; PIL copies it before any write.
+    # Every pattern is opaque, so the RGB version just leaves out alpha.
+    data = _test_image_data(width, height, pattern)
+    if mode == "RGB":
+        return Image.fromarray(np.ascontiguousarray(data[..., :3]), "RGB")
+    return Image.fromarray(data, "RGBA")
+
+
+@functools.lru_cache(maxsize=None)
+def _test_image_data(width, height, pattern):
+    """Build the read-only RGBA pixels of a test image once per size and pattern."""
+    data = np.zeros((height, width, 4), dtype=np.uint8)
+    x = np.arange(width)
+    y = np.arange(height)[:, None]
 
     if pattern == "gradient":
         # Create a grayscale gradient
-        for y in range(height):
-            for x in range(width):
-                gray = int((x / width) * 255)
-                pixels[x, y] = (gray, gray, gray, 255)
+        data[..., :3] = (x / width * 255).astype(np.uint8)[:, None]
+        data[..., 3] = 255
     elif pattern == "color_gradient":
         # Create a color gradient
-        for y in range(height):
-            for x in range(width):
-                r = int((x / width) * 255)
-                g = int((y / height) * 255)
-                b = int(((width - x) / width) * 255)
-                pixels[x, y] = (r, g, b, 255)
+        data[..., 0] = (x / width * 255).astype(np.uint8)
+        data[..., 1] = (y / height * 255).astype(np.uint8)
+        data[..., 2] = ((width - x) / width * 255).astype(np.uint8)
+        data[..., 3] = 255
     elif pattern == "solid_red":
-        for y in range(height):
-            for x in range(width):
-                pixels[x, y] = (255, 0, 0, 255)
+        data[:] = (255, 0, 0, 255)
     elif pattern == "solid_white":
-        for y in range(height):
-            for x in range(width):
-                pixels[x, y] = (255, 255, 255, 255)
+        data[:] = 255
     elif pattern == "checkerboard":
-        for y in range(height):
-            for x in range(width):
-                if (x + y) % 2 == 0:
-                    pixels[x, y] = (0, 0, 0, 255)
-                else:
-                    pixels[x, y] = (255, 255, 255, 255)
+        data[..., :3] = np.where((x + y) % 2 == 0, 0, 255)[..., None]
+        data[..., 3] = 255
+
+    data.setflags(write=False)
+    return data
+
+
+def assert_pixels_in_palette(image, palette_rgb):
+    """Assert that the RGB part of every pixel of an image is one of the palette colors.
+
+    All of the color checks in this module go through this one helper.
+    """
+    # getcolors counts the distinct colors in one pass over the image buffer
+    colors = {color[:3] for _, color in image.getcolors(image.width * image.height)}
+    outside = colors - {tuple(color) for color in palette_rgb}
+    assert not outside, f"Colors outside the palette: {sorted(outside)}"
 
-    return img
+
+@pytest.fixture(scope="session")
+def spectra6_dithered_20():
+    """A 20x20 color gradient dithered to Spectra 6, shared by the tests that inspect it."""
+    img = create_test_image(20, 20, "color_gradient")
+    return dither_image(img, {
+        "ditheringType": "errorDiffusion",
+        "errorDiffusionMatrix": "floydSteinberg",
+        "palette": _cached_palette("spectra6")
+    })
+
+
+@pytest.fixture(scope="session")
+def full_pipeline_50():
+    """The palette, device colors, source and dithered image of the full workflow."""
+    img = create_test_image(50, 50, "color_gradient")
+    palette = _cached_palette("spectra6")
+    device_colors = _cached_device_colors("spectra6")
+    dithered = dither_image(img, {
+        "ditheringType": "errorDiffusion",
+        "errorDiffusionMatrix": "floydSteinberg",
+        "palette": palette
+    })
+    return palette, device_colors, img, dithered
+
+
+@pytest.fixture
+def palette(request):
+    """The named palette given by indirect parametrization, looked up once."""
+    return _cached_palette(request.param)
+
+
+@pytest.fixture
+def device_colors(request):
+    """The named device color set given by indirect parametrization, looked up once."""
+    return _cached_device_colors(request.param)
 
 
 class TestDitherImage:
@@ -69,13 +141,7 @@ class TestDitherImage:
         assert result.size == img.size
 
         # All pixels should be either black or white
-        pixels = np.array(result)
-        for y in range(10):
-            for x in range(10):
-                pixel = pixels[y, x]
-                is_black = all(pixel[:3] == [0, 0, 0])
-                is_white = all(pixel[:3] == [255, 255, 255])
-                assert is_black or is_white, f"Pixel at ({x},{y}) is not black or white: {pixel}"
+        assert_pixels_in_palette(result, _PALETTE_RGB["default"])
 
     def test_error_diffusion_floyd_steinberg(self):
         """Test Floyd-Steinberg error diffusion dithering."""
@@ -90,13 +156,7 @@ class TestDitherImage:
         assert result.size == img.size
 
         # All pixels should be either black or white
-        pixels = np.array(result)
-        unique_colors = set()
-        for y in range(20):
-            for x in range(20):
-                unique_colors.add(tuple(pixels[y, x][:3]))
-
-        assert unique_colors <= {(0, 0, 0), (255, 255, 255)}
+        assert_pixels_in_palette(result, _PALETTE_RGB["default"])
 
     def test_error_diffusion_jarvis(self):
         """Test Jarvis error diffusion dithering."""
@@ -110,29 +170,28 @@ class TestDitherImage:
         assert result is not None
         assert result.size == img.size
 
-    def test_error_diffusion_all_kernels(self):
+    @pytest.mark.parametrize("kernel", [
+        "floydSteinberg",
+        "falseFloydSteinberg",
+        "jarvis",
+        "stucki",
+        "burkes",
+        "sierra3",
+        "sierra2",
+        "Sierra2-4A",
+    ])
+    def test_error_diffusion_all_kernels(self, kernel):
         """Test all error diffusion kernels produce valid output."""
-        kernels = [
-            "floydSteinberg",
-            "falseFloydSteinberg",
-            "jarvis",
-            "stucki",
-            "burkes",
-            "sierra3",
-            "sierra2",
-            "Sierra2-4A",
-        ]
-
         img = create_test_image(15, 15, "gradient")
 
-        for kernel in kernels:
-            result = dither_image(img, {
-                "ditheringType": "errorDiffusion",
-                "errorDiffusionMatrix": kernel,
-                "palette": "default"
-            })
-            assert result is not None, f"Kernel {kernel} returned None"
-            assert result.size == img.size, f"Kernel {kernel} changed image size"
+        result = dither_image(img, {
+            "ditheringType": "errorDiffusion",
+            "errorDiffusionMatrix": kernel,
+            "palette": "default"
+        })
+        assert result is not None, f"Kernel {kernel} returned None"
+        assert result.size == img.size, f"Kernel {kernel} changed image size"
+        assert_pixels_in_palette(result, _PALETTE_RGB["default"])
 
     def test_ordered_dithering(self):
         """Test ordered (Bayer) dithering."""
@@ -147,63 +206,86 @@ class TestDitherImage:
         assert result.size == img.size
 
         # All pixels should be palette colors
-        pixels = np.array(result)
-        unique_colors = set()
-        for y in range(16):
-            for x in range(16):
-                unique_colors.add(tuple(pixels[y, x][:3]))
-
-        assert unique_colors <= {(0, 0, 0), (255, 255, 255)}
+        assert_pixels_in_palette(result, _PALETTE_RGB["default"])
 
-    def test_ordered_dithering_different_matrix_sizes(self):
+    @pytest.mark.parametrize("size", [(2, 2), (4, 4), (8, 8)])
+    def test_ordered_dithering_different_matrix_sizes(self, size):
         """Test ordered dithering with different matrix sizes."""
         img = create_test_image(20, 20, "gradient")
 
-        for size in [(2, 2), (4, 4), (8, 8)]:
-            result = dither_image(img, {
-                "ditheringType": "ordered",
-                "orderedDitheringMatrix": list(size),
-                "palette": "default"
-            })
-            assert result is not None
+        result = dither_image(img, {
+            "ditheringType": "ordered",
+            "orderedDitheringMatrix": list(size),
+            "palette": "default"
+        })
+        assert result is not None
 
-    def test_color_palette_spectra6(self):
+    def test_color_palette_spectra6(self, spectra6_dithered_20):
         """Test dithering with Spectra 6 color palette."""
+        result = spectra6_dithered_20
+
+        assert result is not None
+        assert result.size == (20, 20)
+
+        # All colors should be in the palette
+        assert_pixels_in_palette(result, _PALETTE_RGB["spectra6"])
+
+    def test_weighted_distance_metric(self):
+        """Test that the weighted metric changes the quantized colors in every mode."""
+        img = Image.new("RGBA", (4, 4), (0, 0, 0, 255))
+        palette = ["#640000", "#005000"]
+
+        for dithering_type in ["quantizationOnly", "ordered", "errorDiffusion"]:
+            options = {"ditheringType": dithering_type, "palette": palette}
+            euclidean = np.asarray(dither_image(img, options))
+            weighted = np.asarray(dither_image(img, {**options, "distanceMetric": "weighted"}))
+            assert tuple(euclidean[0, 0, :3]) == (0, 80, 0)
+            assert tuple(weighted[0, 0, :3]) == (100, 0, 0)
+
+    def test_cuda_backend_matches_cpu(self):
+        """Test that the cuda backend (or its CPU fallback) gives the same quantization."""
         img = create_test_image(20, 20, "color_gradient")
-        palette = get_default_palettes("spectra6")
+        options = {"ditheringType": "quantizationOnly", "palette": "spectra6"}
 
-        result = dither_image(img, {
-            "ditheringType": "errorDiffusion",
-            "errorDiffusionMatrix": "floydSteinberg",
-            "palette": palette
-        })
+        cpu = np.asarray(dither_image(img, options))
+        cuda = np.asarray(dither_image(img, {**options, "backend": "cuda"}))
+        np.testing.assert_array_equal(cuda, cpu)
 
-        assert result is not None
+    def test_random_dithering(self):
+        """Test random dithering in both color modes."""
+        img = create_test_image(16, 16, "color_gradient")
 
-        # Convert palette hex to RGB for comparison
-        from epdoptimize.color_helpers import hex_to_rgb
-        palette_rgb = set(tuple(hex_to_rgb(c)) for c in palette)
+        result = dither_image(img, {"ditheringType": "random", "randomDitheringType": "rgb"})
+        assert_pixels_in_palette(result, PRIMARY_RGB)
 
-        pixels = np.array(result)
-        unique_colors = set()
-        for y in range(20):
-            for x in range(20):
-                unique_colors.add(tuple(pixels[y, x][:3]))
+        result = dither_image(
+            img, {"ditheringType": "random", "randomDitheringType": "blackAndWhite"}
+        )
+        assert_pixels_in_palette(result, _PALETTE_RGB["default"])
 
-        # All unique colors should be in the palette
-        assert unique_colors <= palette_rgb
+    @pytest.mark.parametrize("dithering_type", ["quantizationOnly", "ordered", "errorDiffusion"])
+    def test_rgb_input_matches_rgba(self, dithering_type):
+        """Test that an opaque RGB image dithers the same as its RGBA version."""
+        options = {"ditheringType": dithering_type, "palette": "spectra6"}
+        rgba = dither_image(create_test_image(20, 20, "color_gradient"), options)
+        rgb = dither_image(create_test_image(20, 20, "color_gradient", mode="RGB"), options)
+        np.testing.assert_array_equal(np.asarray(rgb), np.asarray(rgba))
 
     def test_none_input_returns_none(self):
         """Test that None input returns None."""
         result = dither_image(None, {})
         assert result is None
 
-    def test_preserves_image_dimensions(self):
+    @pytest.mark.parametrize("serpentine", [False, True])
+    @pytest.mark.parametrize(
+        "width, height",
+        [(10, 10), (100, 50), (50, 100), (1, 100), (100, 1), (1, 1), (0, 5)],
+    )
+    def test_preserves_image_dimensions(self, width, height, serpentine):
         """Test that various image dimensions are preserved."""
-        for width, height in [(10, 10), (100, 50), (50, 100), (1, 100), (100, 1)]:
-            img = create_test_image(width, height, "gradient")
-            result = dither_image(img, {"palette": "default"})
-            assert result.size == (width, height)
+        img = create_test_image(width, height, "gradient")
+        result = dither_image(img, {"palette": "default", "serpentine": serpentine})
+        assert result.size == (width, height)
 
 
 class TestReplaceColors:
@@ -215,66 +297,62 @@ class TestReplaceColors:
         img = create_test_image(10, 10, "checkerboard")
 
         original = ["#000", "#fff"]
-        replacement = ["#e6e6e6", "#212121"]
 
-        result = replace_colors(img, original, replacement)
+        result = replace_colors(img, original, BW_REPLACEMENT)
 
         assert result is not None
         assert result.size == img.size
 
         # Check that colors were replaced
-        from epdoptimize.replace_colors import hex_to_rgb
-        expected_colors = {tuple(hex_to_rgb(c)) for c in replacement}
+        assert_pixels_in_palette(result, _BW_REPLACEMENT_RGB)
 
-        pixels = np.array(result)
-        actual_colors = set()
-        for y in range(10):
-            for x in range(10):
-                actual_colors.add(tuple(pixels[y, x][:3]))
+    def test_replace_preserves_alpha_and_unmatched_pixels(self):
+        """Test that only matching RGB values change."""
+        data = np.array([[[0, 0, 0, 10], [1, 2, 3, 20], [255, 255, 255, 30]]], dtype=np.uint8)
+        img = Image.fromarray(data, "RGBA")
 
-        assert actual_colors <= expected_colors
+        result = replace_colors(img, ["#000", "#fff"], BW_REPLACEMENT)
 
-    def test_replace_with_spectra6(self):
-        """Test replacing Spectra6 palette with device colors."""
-        # Create a dithered image first
-        img = create_test_image(20, 20, "color_gradient")
-        palette = get_default_palettes("spectra6")
-        device_colors = get_device_colors("spectra6")
+        expected = [[[230, 230, 230, 10], [1, 2, 3, 20], [33, 33, 33, 30]]]
+        assert np.asarray(result).tolist() == expected
 
-        dithered = dither_image(img, {
-            "ditheringType": "errorDiffusion",
-            "palette": palette
-        })
+    def test_missing_replacement_color_returns_none(self):
+        """Test that a matched color without a replacement returns None."""
+        img = create_test_image(4, 4, "checkerboard")
+        assert replace_colors(img, ["#000", "#fff"], ["#e6e6e6"]) is None
 
-        result = replace_colors(dithered, palette, device_colors)
+    def test_invalid_hex_color_raises(self):
+        """Test that an invalid hex color raises ValueError."""
+        img = create_test_image(4, 4, "checkerboard")
+        with pytest.raises(ValueError):
+            replace_colors(img, ["#000", "#fff"], ["#e6e6e6", "#nothex"])
+
+    def test_replace_with_spectra6(self, spectra6_dithered_20):
+        """Test replacing Spectra6 palette with device colors."""
+        result = replace_colors(
+            spectra6_dithered_20, _cached_palette("spectra6"), _cached_device_colors("spectra6")
+        )
         assert result is not None
 
 
 class TestGetDefaultPalettes:
     """Test get_default_palettes function."""
 
-    def test_default_palette(self):
+    @pytest.mark.parametrize(
+        "palette, expected_length",
+        [("default", 2), ("gameboy", 4), ("spectra6", 6), ("acep", 7)],
+        indirect=["palette"],
+    )
+    def test_palette_lengths(self, palette, expected_length):
+        """Test the number of colors in each named palette."""
+        assert len(palette) == expected_length
+
+    @pytest.mark.parametrize("palette", ["default"], indirect=True)
+    def test_default_palette(self, palette):
         """Test default black and white palette."""
-        palette = get_default_palettes("default")
-        assert len(palette) == 2
         assert "#000" in palette
         assert "#fff" in palette
 
-    def test_gameboy_palette(self):
-        """Test Game Boy palette."""
-        palette = get_default_palettes("gameboy")
-        assert len(palette) == 4
-
-    def test_spectra6_palette(self):
-        """Test Spectra 6 palette."""
-        palette = get_default_palettes("spectra6")
-        assert len(palette) == 6
-
-    def test_acep_palette(self):
-        """Test AcEP palette."""
-        palette = get_default_palettes("acep")
-        assert len(palette) == 7
-
     def test_case_insensitive(self):
         """Test that palette names are case insensitive."""
         assert get_default_palettes("SPECTRA6") == get_default_palettes("spectra6")
@@ -289,15 +367,14 @@ class TestGetDefaultPalettes:
 class TestGetDeviceColors:
     """Test get_device_colors function."""
 
-    def test_default_device_colors(self):
-        """Test default device colors."""
-        colors = get_device_colors("default")
-        assert len(colors) == 2
-
-    def test_spectra6_device_colors(self):
-        """Test Spectra 6 device colors."""
-        colors = get_device_colors("spectra6")
-        assert len(colors) == 6
+    @pytest.mark.parametrize(
+        "device_colors, expected_length",
+        [("default", 2), ("spectra6", 6)],
+        indirect=["device_colors"],
+    )
+    def test_device_color_lengths(self, device_colors, expected_length):
+        """Test the number of colors in each named device color set."""
+        assert len(device_colors) == expected_length
 
     def test_case_insensitive(self):
         """Test that device color names are case insensitive."""
@@ -312,45 +389,38 @@ class TestGetDeviceColors:
 class TestFullPipeline:
     """Test the complete dithering pipeline."""
 
-    def test_full_workflow(self):
-        """Test complete workflow: load -> dither -> replace colors."""
-        # Create a color image
-        img = create_test_image(50, 50, "color_gradient")
-
-        # Get palettes
-        palette = get_default_palettes("spectra6")
-        device_colors = get_device_colors("spectra6")
-
-        # Dither
-        dithered = dither_image(img, {
-            "ditheringType": "errorDiffusion",
-            "errorDiffusionMatrix": "floydSteinberg",
-            "palette": palette
-        })
+    def test_dither_step(self, full_pipeline_50):
+        """Test the dithering step of the workflow: load -> dither."""
+        _, _, img, dithered = full_pipeline_50
 
         assert dithered is not None
         assert dithered.size == img.size
+        assert_pixels_in_palette(dithered, _PALETTE_RGB["spectra6"])
+
+    def test_replace_step(self, full_pipeline_50):
+        """Test the color replacement step of the workflow: dithered -> device colors."""
+        palette, device_colors, img, dithered = full_pipeline_50
 
-        # Replace colors
         final = replace_colors(dithered, palette, device_colors)
 
         assert final is not None
         assert final.size == img.size
+        assert_pixels_in_palette(final, _DEVICE_RGB["spectra6"])
 
-    def test_all_palettes_with_error_diffusion(self):
+    @pytest.mark.parametrize("palette_name", PALETTE_NAMES)
+    def test_all_palettes_with_error_diffusion(self, palette_name):
         """Test all palettes work with error diffusion."""
         img = create_test_image(30, 30, "color_gradient")
+        palette = _cached_palette(palette_name)
+        device_colors = _cached_device_colors(palette_name)
 
-        for palette_name in ["default", "gameboy", "spectra6", "acep"]:
-            palette = get_default_palettes(palette_name)
-            device_colors = get_device_colors(palette_name)
-
-            dithered = dither_image(img, {
-                "ditheringType": "errorDiffusion",
-                "palette": palette
-            })
+        dithered = dither_image(img, {
+            "ditheringType": "errorDiffusion",
+            "palette": palette
+        })
 
-            assert dithered is not None, f"Dithering failed for {palette_name}"
+        assert dithered is not None, f"Dithering failed for {palette_name}"
 
-            final = replace_colors(dithered, palette, device_colors)
-            assert final is not None, f"Color replacement failed for {palette_name}"
+        final = replace_colors(dithered, palette, device_colors)
+        assert final is not None, f"Color replacement failed for {palette_name}"
+        assert_pixels_in_palette(final, _DEVICE_RGB[palette_name])